@@ -0,0 +1,208 @@
+"""
+Benchmark the Pontoon API scripts offline, against the local stand-in server
+defined in mock_server.py.
+
+Each script runs in a subprocess with an empty cache, and the harness reports
+wall time, peak RSS of the process, and requests and bytes served. The server
+runs in its own subprocess too, so that its memory isn't counted in the RSS
+of the scripts.
+
+Usage:
+    python benchmark.py
+    python benchmark.py --projects 300 --locales 250 --latency 200
+    python benchmark.py --filter pending
+
+    # Check that timed out requests are retried: with --stall-rate, scripts
+    # run with PONTOON_TIMEOUT=1, and some responses take 2 seconds
+    python benchmark.py --stall-rate 0.05 --filter concurrency
+"""
+
+from os.path import abspath, dirname, join
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+API_DIR = dirname(abspath(__file__))
+ROOT_DIR = dirname(API_DIR)
+
+# (label, script path relative to the repository, arguments)
+SCRIPTS = [
+    ("pending_suggestions", "API/pending_suggestions.py", []),
+    ("pending_suggestions --stream", "API/pending_suggestions.py", ["--stream"]),
+    (
+        "pending_suggestions --concurrency 8",
+        "API/pending_suggestions.py",
+        ["--concurrency", "8"],
+    ),
+    ("extract_firefox_locales_data", "API/extract_firefox_locales_data.py", []),
+    (
+        "extract_firefox_locales_data --stream",
+        "API/extract_firefox_locales_data.py",
+        ["--stream"],
+    ),
+    (
+        "extract_firefox_locales_data --concurrency 8",
+        "API/extract_firefox_locales_data.py",
+        ["--concurrency", "8"],
+    ),
+    (
+        "extract_firefox_locales_data --latest-activity",
+        "API/extract_firefox_locales_data.py",
+        ["--latest-activity"],
+    ),
+    (
+        "missing_locales",
+        "API/missing_locales.py",
+        ["--pontoon", "firefox", "--repo", "firefox-l10n"],
+    ),
+    (
+        "extract_completion_data",
+        "stats/health_report/extract_completion_data.py",
+        [],
+    ),
+    ("localization_reports", "API/localization_reports.py", []),
+    ("localization_reports --stream", "API/localization_reports.py", ["--stream"]),
+]
+
+
+# PONTOON_TIMEOUT of the scripts when some responses stall (--stall-rate)
+STALL_TIMEOUT = 1
+
+
+def start_server(args):
+    """
+    Run mock_server.py in a subprocess, and return the process and its URL.
+
+    The server holds the synthetic data: scripts forked from a process with a
+    large peak RSS would report that peak too, so the harness stays small.
+    """
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-u",
+            join(API_DIR, "mock_server.py"),
+            "--port=0",
+            f"--projects={args.projects}",
+            f"--locales={args.locales}",
+            f"--latency={args.latency}",
+            f"--error-rate={args.error_rate}",
+            f"--stall-rate={args.stall_rate}",
+            f"--stall={STALL_TIMEOUT * 2}",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    # "Serving N projects x M locales on URL"
+    url = process.stdout.readline().split()[-1]
+
+    return process, url
+
+
+def server_stats(url, path):
+    with urllib.request.urlopen(f"{url}{path}") as response:
+        return json.load(response)
+
+
+def run_script(url, script, arguments, timeout=None):
+    """Run script and return wall time (s), peak RSS (MiB), exit status."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = dict(
+            os.environ,
+            PONTOON_URL=url,
+            GITHUB_API_URL=url,
+            PONTOON_SCRIPTS_CACHE=join(tmp_dir, "cache"),
+        )
+        if timeout is not None:
+            env["PONTOON_TIMEOUT"] = str(timeout)
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, join(ROOT_DIR, script)] + arguments,
+            cwd=tmp_dir,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        # wait4 returns the resource usage of this child only
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    rss = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+    return elapsed, rss, os.waitstatus_to_exitcode(status)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--projects", type=int, default=50, help="Number of projects to serve"
+    )
+    parser.add_argument(
+        "--locales", type=int, default=150, help="Number of locales per project"
+    )
+    parser.add_argument(
+        "--latency",
+        type=int,
+        default=0,
+        help="Average latency added to each response, in milliseconds",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0,
+        help="Fraction of requests failing with HTTP 503 (e.g. 0.1)",
+    )
+    parser.add_argument(
+        "--stall-rate",
+        type=float,
+        default=0,
+        help="Fraction of responses arriving after the timeout of the scripts",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="Number of runs for each script"
+    )
+    parser.add_argument(
+        "--filter", default="", help="Only run scripts whose label contains FILTER"
+    )
+    args = parser.parse_args()
+
+    server, url = start_server(args)
+
+    print(
+        f"{args.projects} projects x {args.locales} locales, "
+        f"{args.latency} ms latency\n"
+    )
+    print(
+        f"{'Script':<48} {'Wall (s)':>9} {'RSS (MiB)':>10} {'Requests':>9} {'KiB sent':>10}"
+    )
+    try:
+        for label, script, arguments in SCRIPTS:
+            if args.filter not in label:
+                continue
+
+            for _ in range(args.repeat):
+                server_stats(url, "/__reset")
+                elapsed, rss, exit_code = run_script(
+                    url, script, arguments, STALL_TIMEOUT if args.stall_rate else None
+                )
+                stats = server_stats(url, "/__stats")
+                line = (
+                    f"{label:<48} {elapsed:>9.2f} {rss:>10.1f} "
+                    f"{stats['requests']:>9} {stats['bytes_sent'] / 1024:>10.1f}"
+                )
+                if exit_code:
+                    line += f"  (exit code {exit_code})"
+                print(line)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,171 +1,165 @@
 #!/usr/bin/env python3
 
-import json
-import os
+import argparse
 import sys
-from urllib.parse import quote as urlquote
-from urllib.request import urlopen
 
+from pontoon_api import iter_localizations, projects_query, query_many
 
-def main():
-    locales = [
-        "ach",
-        "af",
-        "an",
-        "ar",
-        "ast",
-        "az",
-        "be",
-        "bg",
-        "bn",
-        "br",
-        "bs",
-        "ca",
-        "ca-valencia",
-        "cak",
-        "cs",
-        "cy",
-        "da",
-        "de",
-        "dsb",
-        "el",
-        "en-CA",
-        "en-GB",
-        "eo",
-        "es-AR",
-        "es-CL",
-        "es-ES",
-        "es-MX",
-        "et",
-        "eu",
-        "fa",
-        "ff",
-        "fi",
-        "fr",
-        "fy-NL",
-        "ga-IE",
-        "gd",
-        "gl",
-        "gn",
-        "gu-IN",
-        "he",
-        "hi-IN",
-        "hr",
-        "hsb",
-        "hu",
-        "hy-AM",
-        "ia",
-        "id",
-        "is",
-        "it",
-        "ja",
-        "ka",
-        "kab",
-        "kk",
-        "km",
-        "kn",
-        "ko",
-        "lij",
-        "lt",
-        "lv",
-        "mk",
-        "mr",
-        "ms",
-        "my",
-        "nb-NO",
-        "ne-NP",
-        "nl",
-        "nn-NO",
-        "oc",
-        "pa-IN",
-        "pl",
-        "pt-BR",
-        "pt-PT",
-        "rm",
-        "ro",
-        "ru",
-        "si",
-        "sk",
-        "sl",
-        "son",
-        "sq",
-        "sr",
-        "sv-SE",
-        "ta",
-        "te",
-        "th",
-        "tl",
-        "tr",
-        "trs",
-        "uk",
-        "ur",
-        "uz",
-        "vi",
-        "xh",
-        "zh-CN",
-        "zh-TW",
-    ]
+LOCALES = [
+    "ach",
+    "af",
+    "an",
+    "ar",
+    "ast",
+    "az",
+    "be",
+    "bg",
+    "bn",
+    "br",
+    "bs",
+    "ca",
+    "ca-valencia",
+    "cak",
+    "cs",
+    "cy",
+    "da",
+    "de",
+    "dsb",
+    "el",
+    "en-CA",
+    "en-GB",
+    "eo",
+    "es-AR",
+    "es-CL",
+    "es-ES",
+    "es-MX",
+    "et",
+    "eu",
+    "fa",
+    "ff",
+    "fi",
+    "fr",
+    "fy-NL",
+    "ga-IE",
+    "gd",
+    "gl",
+    "gn",
+    "gu-IN",
+    "he",
+    "hi-IN",
+    "hr",
+    "hsb",
+    "hu",
+    "hy-AM",
+    "ia",
+    "id",
+    "is",
+    "it",
+    "ja",
+    "ka",
+    "kab",
+    "kk",
+    "km",
+    "kn",
+    "ko",
+    "lij",
+    "lt",
+    "lv",
+    "mk",
+    "mr",
+    "ms",
+    "my",
+    "nb-NO",
+    "ne-NP",
+    "nl",
+    "nn-NO",
+    "oc",
+    "pa-IN",
+    "pl",
+    "pt-BR",
+    "pt-PT",
+    "rm",
+    "ro",
+    "ru",
+    "si",
+    "sk",
+    "sl",
+    "son",
+    "sq",
+    "sr",
+    "sv-SE",
+    "ta",
+    "te",
+    "th",
+    "tl",
+    "tr",
+    "trs",
+    "uk",
+    "ur",
+    "uz",
+    "vi",
+    "xh",
+    "zh-CN",
+    "zh-TW",
+]
 
-    # Get completion stats for locales from Pontoon
-    query = """
-{
-    projects {
-        name
-        slug
-        localizations {
-            locale {
-                code
+# Localization fields used by this report
+FIELDS = ["missingStrings", "unreviewedStrings", "totalStrings"]
+
+
+def aggregate(locale_data, project, element):
+    slug = project["slug"]
+    if slug in ["pontoon-intro", "tutorial"]:
+        return
+
+    locale = element["locale"]["code"]
+    if not locale in locale_data:
+        locale_data[locale] = {
+            "stats": {
+                "missing": 0,
+                "unreviewed": 0,
+                "projects": 0,
             },
-            missingStrings,
-            unreviewedStrings,
-            totalStrings
         }
+    locale_data[locale][slug] = {
+        "missing": element["missingStrings"],
+        "unreviewed": element["unreviewedStrings"],
     }
-}
-"""
-    projects_list = {}
-    locale_data = {}
-    try:
-        print("Reading Pontoon stats...")
-        url = f"https://pontoon.mozilla.org/graphql?query={urlquote(query)}&raw"
-        response = urlopen(url)
-        json_data = json.load(response)
-
-        for project in json_data["data"]["projects"]:
-            slug = project["slug"]
-            if slug in ["pontoon-intro", "tutorial"]:
-                continue
-            if not slug in projects_list:
-                projects_list[slug] = project["name"]
-
-            for element in project["localizations"]:
-                locale = element["locale"]["code"]
-                if not locale in locale_data:
-                    locale_data[locale] = {
-                        "stats": {
-                            "missing": 0,
-                            "unreviewed": 0,
-                            "projects": 0,
-                        },
-                    }
-                locale_data[locale][slug] = {
-                    "missing": element["missingStrings"],
-                    "unreviewed": element["unreviewedStrings"],
-                }
-                locale_data[locale]["stats"]["projects"] += 1
-                locale_data[locale]["stats"]["missing"] += element["missingStrings"]
-                locale_data[locale]["stats"]["unreviewed"] += element[
-                    "unreviewedStrings"
-                ]
-    except Exception as e:
-        print(e)
+    locale_data[locale]["stats"]["projects"] += 1
+    locale_data[locale]["stats"]["missing"] += element["missingStrings"]
+    locale_data[locale]["stats"]["unreviewed"] += element["unreviewedStrings"]
+
+
+def fetch_latest_activity(locales, concurrency=16):
+    """
+    Return the date of the latest activity for each locale, fetched with up
+    to `concurrency` parallel requests. Locales that couldn't be fetched get
+    an empty date and a warning, without affecting the others.
+    """
+    queries = [
+        f'{{locale(code:"{locale}"){{latestActivity{{date}}}}}}' for locale in locales
+    ]
+    latest_activity = {}
+    results = list(query_many(queries, concurrency, return_exceptions=True))
+    for locale, data in zip(locales, results):
+        if isinstance(data, Exception) or not (data or {}).get("locale"):
+            error = data if isinstance(data, Exception) else "unknown locale"
+            print(f"WARNING: no latest activity for {locale}: {error}")
+            latest_activity[locale] = ""
+            continue
+        activity = data["locale"]["latestActivity"]
+        latest_activity[locale] = activity["date"] if activity else ""
+
+    return latest_activity
 
+
+def write_output(locale_data, filename="output.csv", latest_activity=None):
     output = []
     output.append(
         "Locale,Number of Projects,Projects,Missing Strings,Pending Suggestions,Latest Activity"
     )
     # Only print requested locales
-    for locale in locales:
+    for locale in LOCALES:
         if not locale in locale_data:
             print("ERROR: no data available for {}".format(locale))
         data = locale_data[locale]["stats"]
@@ -175,19 +169,72 @@ def main():
         project_slugs.remove("stats")
         project_slugs.sort()
         output.append(
-            "{},{},{},{},{},".format(
+            "{},{},{},{},{},{}".format(
                 locale,
                 data["projects"],
                 " ".join(project_slugs),
                 data["missing"],
                 data["unreviewed"],
+                (latest_activity or {}).get(locale, ""),
             )
         )
 
     # Save locally
-    with open("output.csv", "w") as f:
+    with open(filename, "w") as f:
         f.write("\n".join(output))
-        print("Data stored as output.csv")
+        print(f"Data stored as {filename}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Parse the Pontoon response while it's being downloaded",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=0,
+        help="Fetch projects one by one, with up to CONCURRENCY parallel requests",
+    )
+    parser.add_argument(
+        "--latest-activity",
+        action="store_true",
+        help="Fetch the Latest Activity column (one request per locale)",
+    )
+    parser.add_argument(
+        "--activity-concurrency",
+        type=int,
+        default=16,
+        help="Parallel requests used to fetch latest activity (default: 16)",
+    )
+    args = parser.parse_args()
+
+    # Get completion stats for locales from Pontoon
+    locale_data = {}
+    try:
+        print("Reading Pontoon stats...")
+        for project, element in iter_localizations(
+            projects_query(FIELDS), stream=args.stream, concurrency=args.concurrency
+        ):
+            aggregate(locale_data, project, element)
+    except Exception as e:
+        # Don't write partial output. Only with --concurrency are the projects
+        # already fetched kept for the next run (see query_many).
+        sys.exit(f"Error reading Pontoon stats: {e}")
+
+    latest_activity = None
+    if args.latest_activity:
+        try:
+            print("Reading latest activity...")
+            latest_activity = fetch_latest_activity(
+                LOCALES, args.activity_concurrency
+            )
+        except Exception as e:
+            sys.exit(f"Error reading latest activity: {e}")
+
+    write_output(locale_data, latest_activity=latest_activity)
 
 
 if __name__ == "__main__":
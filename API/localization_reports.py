@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+"""
+Generate the reports of pending_suggestions.py, extract_firefox_locales_data.py
+and stats/health_report/extract_completion_data.py from a single Pontoon
+query, aggregating all of them in one pass over the localizations.
+
+Each report is stored in its own file in the output folder:
+* pending_suggestions.csv
+* firefox_locales_data.csv
+* completion_data.csv
+
+Usage:
+    python localization_reports.py
+    python localization_reports.py --reports pending_suggestions completion_data
+    python localization_reports.py --stream --output-dir reports
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "stats", "health_report"
+    ),
+)
+import extract_completion_data
+import extract_firefox_locales_data
+import pending_suggestions
+from pontoon_api import iter_localizations, projects_query
+
+REPORTS = {
+    "pending_suggestions": pending_suggestions,
+    "firefox_locales_data": extract_firefox_locales_data,
+    "completion_data": extract_completion_data,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--reports",
+        nargs="+",
+        choices=REPORTS.keys(),
+        default=list(REPORTS.keys()),
+        help="Reports to generate (default: all)",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default=".",
+        help="Folder to store reports in",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Parse the Pontoon response while it's being downloaded",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=0,
+        help="Fetch projects one by one, with up to CONCURRENCY parallel requests",
+    )
+    args = parser.parse_args()
+
+    # Request the union of the fields needed by all reports
+    fields = []
+    for name in args.reports:
+        fields += [f for f in REPORTS[name].FIELDS if f not in fields]
+
+    data = {name: {} for name in args.reports}
+    try:
+        print("Reading Pontoon stats...")
+        for project, element in iter_localizations(
+            projects_query(fields), stream=args.stream, concurrency=args.concurrency
+        ):
+            for name in args.reports:
+                REPORTS[name].aggregate(data[name], project, element)
+    except Exception as e:
+        # Don't write partial reports (see iter_localizations for what a
+        # rerun fetches again)
+        sys.exit(f"Error reading Pontoon stats: {e}")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for name in args.reports:
+        REPORTS[name].write_output(
+            data[name], os.path.join(args.output_dir, f"{name}.csv")
+        )
+
+
+if __name__ == "__main__":
+    main()
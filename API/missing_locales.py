@@ -3,70 +3,173 @@ Retrieves a list of locales missing in Pontoon for a single project by comparing
 
 Output as CSV file with column Missing Locales.
 
+With --manifest, compares several projects at once. The manifest is a CSV
+file with columns pontoon, owner, repo, path (owner defaults to mozilla-l10n
+and path to the root folder), e.g.:
+
+pontoon,owner,repo,path
+firefox-for-android,mozilla-l10n,android-l10n,mozilla-mobile/fenix
+mozilla-vpn-client,mozilla-l10n,mozilla-vpn-client-l10n,
+
+All lookups run concurrently, and the output is a project x missing locale
+matrix (output.csv with --csv).
+
+With --git-tree, GitHub locales are read from the recursive git tree of the
+repository (one request, no limit on the number of folders, cached by commit
+SHA). --any-depth also finds locale folders anywhere below --path: folders
+next to a folder named after a Pontoon locale are considered locales.
 """
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import argparse
-import json
+import csv
 import sys
-from urllib.parse import quote as urlquote
-from urllib.request import urlopen
 
+from pontoon_api import APIError, get_github, get_github_tree_dirs, query_pontoon
 
-def retrieve_pontoon_locales(project):
+IGNORED_FOLDERS = ["templates", "configs"]
+
+
+def pontoon_locales(project):
     query = f'{{project(slug:"{project}"){{name,localizations{{locale{{code}}}}}}}}'
-    url = f"https://pontoon.mozilla.org/graphql?query={urlquote(query)}&raw"
 
-    try:
-        response = urlopen(url)
-        json_data = json.load(response)
-        if "errors" in json_data:
-            sys.exit(f"Project {project} not found in Pontoon.")
+    json_data = query_pontoon(query)
+    if "errors" in json_data:
+        raise APIError(f"Project {project} not found in Pontoon.")
 
-        locale_list = []
-        for locale in json_data["data"]["project"]["localizations"]:
-            locale_list.append(locale["locale"]["code"])
-        locale_list.sort()
+    locale_list = []
+    for locale in json_data["data"]["project"]["localizations"]:
+        locale_list.append(locale["locale"]["code"])
+    locale_list.sort()
 
-        return locale_list
-    except Exception as e:
-        sys.exit(e)
+    return locale_list
 
 
-def retrieve_github_locales(owner, repo, path):
+def github_locales(owner, repo, path):
     query = f"/repos/{owner}/{repo}/contents/{path}"
-    url = f"https://api.github.com{urlquote(query)}"
 
-    ignored_folders = ["templates", "configs"]
+    json_data = get_github(query)
+
+    # Ignore files, hidden folder, non-locale folders via ignore list
+    locale_list = [
+        e["name"]
+        for e in json_data
+        if e["type"] == "dir"
+        and not e["name"].startswith(".")
+        and e["name"] not in IGNORED_FOLDERS
+    ]
+    locale_list.sort()
+
+    return locale_list
+
+
+def github_tree_locales(owner, repo, path, any_depth=False):
+    path = path.strip("/")
+    prefix = f"{path}/" if path else ""
 
+    # Index folders below path by parent folder, ignoring hidden and
+    # non-locale folders
+    subfolders = defaultdict(list)
+    for folder in get_github_tree_dirs(owner, repo):
+        if not folder.startswith(prefix):
+            continue
+        parent, _, name = folder.rpartition("/")
+        if name.startswith(".") or name in IGNORED_FOLDERS:
+            continue
+        subfolders[parent].append(name)
+
+    if not any_depth:
+        return sorted(subfolders.get(path, []))
+
+    # Locale folders are the ones next to a folder named after a Pontoon locale
+    json_data = query_pontoon("{locales{code}}")
+    known_locales = {locale["code"] for locale in json_data["data"]["locales"]}
+    locale_list = set()
+    for names in subfolders.values():
+        if known_locales.intersection(names):
+            locale_list.update(names)
+
+    return sorted(locale_list)
+
+
+def retrieve_pontoon_locales(project):
     try:
-        response = urlopen(url)
-        json_data = json.load(response)
-
-        # Ignore files, hidden folder, non-locale folders via ignore list
-        locale_list = [
-            e["name"]
-            for e in json_data
-            if e["type"] == "dir"
-            and not e["name"].startswith(".")
-            and e["name"] not in ignored_folders
-        ]
-        locale_list.sort()
+        return pontoon_locales(project)
+    except Exception as e:
+        sys.exit(e)
+
 
-        return locale_list
+def retrieve_github_locales(owner, repo, path, discover=github_locales):
+    try:
+        return discover(owner, repo, path)
     except Exception as e:
         sys.exit(f"GitHub error: {e}")
 
 
+def read_manifest(filename):
+    with open(filename, newline="") as f:
+        return [
+            {
+                "pontoon": row["pontoon"].strip(),
+                "owner": (row.get("owner") or "").strip() or "mozilla-l10n",
+                "repo": row["repo"].strip(),
+                "path": (row.get("path") or "").strip(),
+            }
+            for row in csv.DictReader(f)
+            if row.get("pontoon")
+        ]
+
+
+def find_missing_locales(entry, discover=github_locales):
+    """Return (missing locales, error) for a manifest entry."""
+    try:
+        pontoon = pontoon_locales(entry["pontoon"])
+        github = discover(entry["owner"], entry["repo"], entry["path"])
+    except Exception as e:
+        return [], str(e)
+
+    return sorted(set(github) - set(pontoon)), ""
+
+
+def batch(manifest, concurrency, csv_output, discover=github_locales):
+    entries = read_manifest(manifest)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(
+            executor.map(partial(find_missing_locales, discover=discover), entries)
+        )
+
+    all_missing = sorted({locale for missing, _ in results for locale in missing})
+    output = [["Project", "Repository"] + all_missing + ["Error"]]
+    for entry, (missing, error) in zip(entries, results):
+        repository = f"{entry['owner']}/{entry['repo']}/{entry['path']}".rstrip("/")
+        if error:
+            print(f"{entry['pontoon']}: ERROR {error}")
+        else:
+            print(f"{entry['pontoon']}: {', '.join(missing) or '-'}")
+
+        row = [entry["pontoon"], repository]
+        row += ["x" if locale in missing else "" for locale in all_missing]
+        row.append(error)
+        output.append(row)
+
+    if csv_output:
+        with open("output.csv", "w", newline="") as f:
+            csv.writer(f, lineterminator="\n").writerows(output)
+            print("Missing locales saved to output.csv")
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--pontoon",
-        required=True,
+        required=False,
         dest="pontoon_project",
         help="Pontoon project name",
     )
     parser.add_argument(
         "--repo",
-        required=True,
+        required=False,
         dest="github_repo",
         help="GitHub repository name",
     )
@@ -84,6 +187,32 @@ def main():
         dest="github_path",
         help="GitHub path that contains locale folders",
     )
+    parser.add_argument(
+        "--manifest",
+        required=False,
+        help="CSV file listing projects to compare (pontoon, owner, repo, path)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        required=False,
+        type=int,
+        default=16,
+        help="Parallel lookups with --manifest (default: 16)",
+    )
+    parser.add_argument(
+        "--git-tree",
+        required=False,
+        action="store_true",
+        default=False,
+        help="Find GitHub locales with the git trees API",
+    )
+    parser.add_argument(
+        "--any-depth",
+        required=False,
+        action="store_true",
+        default=False,
+        help="Find locale folders at any depth below --path (implies --git-tree)",
+    )
     parser.add_argument(
         "--csv",
         required=False,
@@ -95,13 +224,23 @@ def main():
 
     args = parser.parse_args()
 
-    pontoon_locales = retrieve_pontoon_locales(args.pontoon_project)
-    github_locales = retrieve_github_locales(
-        args.github_owner, args.github_repo, args.github_path
+    discover = github_locales
+    if args.git_tree or args.any_depth:
+        discover = partial(github_tree_locales, any_depth=args.any_depth)
+
+    if args.manifest:
+        batch(args.manifest, args.concurrency, args.csv_output, discover)
+        return
+    if not (args.pontoon_project and args.github_repo):
+        parser.error("--pontoon and --repo are required without --manifest")
+
+    pontoon_list = retrieve_pontoon_locales(args.pontoon_project)
+    github_list = retrieve_github_locales(
+        args.github_owner, args.github_repo, args.github_path, discover
     )
 
     output = ["Missing Locales"]
-    missing_locales = list(set(github_locales) - set(pontoon_locales))
+    missing_locales = list(set(github_list) - set(pontoon_list))
     missing_locales.sort()
 
     print(f"Missing locales in Pontoon: {', '.join(missing_locales)}")
@@ -0,0 +1,404 @@
+"""
+Local stand-in for Pontoon's GraphQL API and GitHub's contents API, serving
+synthetic data, so that the scripts in this folder can be tested and
+benchmarked offline.
+
+Data is generated for N projects x M locales: the first projects and locales
+use real slugs and codes (the ones hardcoded in the scripts), the rest are
+synthetic. Numbers are random, but stable for a given --seed.
+
+Point the scripts to the server with environment variables, e.g.:
+    python mock_server.py --projects 200 --locales 250 --latency 100
+    python mock_server.py --error-rate 0.2
+    python mock_server.py --stall-rate 0.1 --stall 5
+    PONTOON_URL=http://127.0.0.1:8000 python pending_suggestions.py
+
+Supported requests:
+    /graphql?query=...&raw                  `projects`, `project(slug)`,
+                                            `locales`, `locale(code)` queries
+    /repos/{owner}/{repo}/contents/{path}   One folder per locale, with ETag
+    /repos/{owner}/{repo}/commits/HEAD      Commit SHA, with ETag
+    /repos/{owner}/{repo}/git/trees/{sha}   Locale folders nested in l10n/
+    /__stats                                Requests served, bytes sent and
+                                            304 responses
+    /__reset                                Reset counters above
+"""
+
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+
+# Slugs and codes hardcoded in the scripts come first, so that they all find
+# the data they expect.
+KNOWN_PROJECTS = [
+    "firefox",
+    "firefox-for-android",
+    "firefox-for-ios",
+    "firefox-monitor-website",
+    "firefox-relay-website",
+    "mozilla-accounts",
+    "mozilla-vpn-client",
+]
+KNOWN_LOCALES = """
+    ach af an ar ast az be bg bn br bs ca ca-valencia cak cs cy da de dsb el
+    en-CA en-GB eo es-AR es-CL es-ES es-MX et eu fa ff fi fr fy-NL ga-IE gd gl
+    gn gu-IN he hi-IN hr hsb hu hy-AM ia id is it ja ka kab kk km kn ko lij lt
+    lv mk mr ms my nb-NO ne-NP nl nn-NO oc pa-IN pl pt-BR pt-PT rm ro ru si sk
+    sl son sq sr sv-SE ta te th tl tr trs uk ur uz vi xh zh-CN zh-TW
+""".split()
+
+
+class SyntheticData:
+    def __init__(self, projects, locales, seed=0):
+        self.seed = seed
+        self.projects = [
+            KNOWN_PROJECTS[i] if i < len(KNOWN_PROJECTS) else f"project-{i}"
+            for i in range(projects)
+        ]
+        self.locales = [
+            KNOWN_LOCALES[i] if i < len(KNOWN_LOCALES) else f"x{i}"
+            for i in range(locales)
+        ]
+
+    def project(self, slug):
+        if slug not in self.projects:
+            return None
+
+        return {
+            "name": slug.replace("-", " ").title(),
+            "slug": slug,
+            "localizations": lambda: [
+                self.localization(slug, locale) for locale in self.locales
+            ],
+        }
+
+    def locale(self, code):
+        if code not in self.locales:
+            return None
+
+        rng = random.Random(f"{self.seed}:{code}")
+        date = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(
+            seconds=rng.randint(0, 365 * 24 * 3600)
+        )
+        return {
+            "code": code,
+            "name": code,
+            "latestActivity": {
+                "type": rng.choice(["submitted", "approved"]),
+                "date": date.isoformat(),
+                "user": {"name": f"user-{rng.randint(1, 1000)}"},
+            },
+        }
+
+    def localization(self, slug, locale):
+        rng = random.Random(f"{self.seed}:{slug}:{locale}")
+        total = rng.randint(100, 20000)
+        missing = rng.randint(0, total // 2)
+        pretranslated = rng.randint(0, missing)
+        warnings = rng.randint(0, total // 100)
+        errors = rng.randint(0, total // 200)
+        approved = total - missing - warnings - errors
+
+        return {
+            "locale": {"code": locale, "name": locale},
+            "project": {"slug": slug, "name": slug},
+            "totalStrings": total,
+            "approvedStrings": approved,
+            "pretranslatedStrings": pretranslated,
+            "stringsWithWarnings": warnings,
+            "stringsWithErrors": errors,
+            "missingStrings": missing,
+            "unreviewedStrings": rng.randint(0, total // 10),
+        }
+
+
+def parse_selection(tokens, pos=0):
+    """Parse a GraphQL selection set into a list of (field, args, selection)."""
+    assert tokens[pos] == "{"
+    pos += 1
+    fields = []
+    while tokens[pos] != "}":
+        name = tokens[pos]
+        pos += 1
+        args = {}
+        if tokens[pos] == "(":
+            pos += 1
+            while tokens[pos] != ")":
+                args[tokens[pos]] = tokens[pos + 2].strip('"')
+                pos += 3
+            pos += 1
+        selection = None
+        if tokens[pos] == "{":
+            selection, pos = parse_selection(tokens, pos)
+        fields.append((name, args, selection))
+
+    return fields, pos + 1
+
+
+def resolve(value, selection):
+    if callable(value):
+        value = value()
+    if value is None or selection is None:
+        return value
+    if isinstance(value, list):
+        return [resolve(item, selection) for item in value]
+
+    return {name: resolve(value.get(name), sub) for name, _, sub in selection}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+
+        if url.path == "/__stats":
+            return self.send_json(server.stats, count=False)
+        if url.path == "/__reset":
+            with server.lock:
+                server.stats = {"requests": 0, "bytes_sent": 0, "not_modified": 0}
+            return self.send_json(server.stats, count=False)
+
+        if server.latency:
+            time.sleep(server.latency * random.uniform(0.5, 1.5))
+        if random.random() < server.error_rate:
+            return self.send_json({"message": "Service Unavailable"}, status=503)
+        if random.random() < server.stall_rate:
+            # Longer than the client timeout: the response arrives too late
+            time.sleep(server.stall)
+
+        if url.path == "/graphql":
+            query = parse_qs(url.query).get("query", [""])[0]
+            return self.send_json(self.graphql(query))
+
+        match = re.match(r"^/repos/([^/]+)/([^/]+)/contents/?(.*)$", unquote(url.path))
+        if match:
+            return self.send_json(self.contents(*match.groups()), etag=True)
+
+        match = re.match(r"^/repos/([^/]+)/([^/]+)/commits/HEAD$", url.path)
+        if match:
+            sha = self.head_sha(*match.groups())
+            return self.send_body(sha.encode("utf-8"), "text/plain", etag=True)
+
+        match = re.match(r"^/repos/([^/]+)/([^/]+)/git/trees/(\w+)$", url.path)
+        if match:
+            return self.send_json(self.tree(*match.groups()))
+
+        self.send_json({"message": "Not Found"}, status=404)
+
+    def graphql(self, query):
+        data = self.server.data
+        tokens = re.findall(r'[A-Za-z_]\w*|"[^"]*"|[{}():]', query)
+        try:
+            selection, _ = parse_selection(tokens)
+        except (AssertionError, IndexError):
+            return {"errors": [{"message": "Syntax error"}]}
+
+        result = {}
+        errors = []
+        for name, args, sub in selection:
+            if name == "projects":
+                result[name] = resolve(
+                    [data.project(slug) for slug in data.projects], sub
+                )
+            elif name == "project":
+                project = data.project(args.get("slug"))
+                if project is None:
+                    errors.append({"message": "Project matching query does not exist."})
+                result[name] = resolve(project, sub)
+            elif name == "locales":
+                result[name] = resolve(
+                    [data.locale(code) for code in data.locales], sub
+                )
+            elif name == "locale":
+                locale = data.locale(args.get("code"))
+                if locale is None:
+                    errors.append({"message": "Locale matching query does not exist."})
+                result[name] = resolve(locale, sub)
+            else:
+                errors.append({"message": f"Cannot query field {name}"})
+
+        response = {"data": result}
+        if errors:
+            response["errors"] = errors
+        return response
+
+    def contents(self, owner, repo, path):
+        # Each repository has a few locales that are not available in Pontoon
+        rng = random.Random(f"{self.server.data.seed}:{owner}/{repo}")
+        locales = self.server.data.locales + [
+            f"y{rng.randint(0, 50)}" for _ in range(rng.randint(0, 3))
+        ]
+
+        entries = [{"name": ".github", "type": "dir"}]
+        entries += [{"name": "templates", "type": "dir"}]
+        entries += [{"name": "README.md", "type": "file"}]
+        entries += [{"name": locale, "type": "dir"} for locale in sorted(set(locales))]
+
+        for entry in entries:
+            entry["path"] = f"{path}/{entry['name']}".lstrip("/")
+        return entries
+
+    def head_sha(self, owner, repo):
+        key = f"{self.server.data.seed}:{owner}/{repo}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def tree(self, owner, repo, sha):
+        """
+        Locale folders are nested in l10n/, next to unrelated folders, with
+        a few locales that are not available in Pontoon.
+        """
+        if sha != self.head_sha(owner, repo):
+            return {"sha": sha, "tree": [], "truncated": False}
+
+        locales = [entry["name"] for entry in self.contents(owner, repo, "")]
+        entries = []
+        for folder in [".github", "src", "src/lib", "l10n", "l10n/templates"]:
+            entries.append({"path": folder, "type": "tree"})
+        for locale in locales:
+            if locale.startswith(".") or "." in locale or locale == "templates":
+                continue
+            entries.append({"path": f"l10n/{locale}", "type": "tree"})
+            entries.append({"path": f"l10n/{locale}/app", "type": "tree"})
+            entries.append({"path": f"l10n/{locale}/app/main.ftl", "type": "blob"})
+
+        return {"sha": sha, "tree": entries, "truncated": False}
+
+    def send_json(self, data, status=200, count=True, etag=False):
+        self.send_body(
+            json.dumps(data).encode("utf-8"),
+            "application/json",
+            status=status,
+            count=count,
+            etag=etag,
+        )
+
+    def send_body(self, body, content_type, status=200, count=True, etag=False):
+        headers = {"Content-Type": content_type}
+        if etag:
+            headers["ETag"] = f'"{hashlib.sha1(body).hexdigest()}"'
+            if self.headers.get("If-None-Match") == headers["ETag"]:
+                status = 304
+                body = b""
+        if body and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        headers["Content-Length"] = str(len(body))
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+        if count:
+            with self.server.lock:
+                self.server.stats["requests"] += 1
+                self.server.stats["bytes_sent"] += len(body)
+                if status == 304:
+                    self.server.stats["not_modified"] += 1
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        data,
+        latency=0,
+        error_rate=0,
+        stall_rate=0,
+        stall=0,
+        verbose=False,
+    ):
+        super().__init__(address, Handler)
+        self.data = data
+        self.latency = latency
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "bytes_sent": 0, "not_modified": 0}
+
+    def handle_error(self, request, client_address):
+        # Clients close the connection of stalled responses after their timeout
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument(
+        "--projects", type=int, default=50, help="Number of projects to serve"
+    )
+    parser.add_argument(
+        "--locales", type=int, default=150, help="Number of locales per project"
+    )
+    parser.add_argument(
+        "--latency",
+        type=int,
+        default=0,
+        help="Average latency added to each response, in milliseconds",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0,
+        help="Fraction of requests failing with HTTP 503 (e.g. 0.1)",
+    )
+    parser.add_argument(
+        "--stall-rate",
+        type=float,
+        default=0,
+        help="Fraction of responses delayed by STALL seconds (e.g. 0.1)",
+    )
+    parser.add_argument(
+        "--stall",
+        type=float,
+        default=5,
+        help="Delay of stalled responses, in seconds (default: 5)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for data")
+    args = parser.parse_args()
+
+    data = SyntheticData(args.projects, args.locales, args.seed)
+    server = MockServer(
+        ("127.0.0.1", args.port),
+        data,
+        latency=args.latency / 1000,
+        error_rate=args.error_rate,
+        stall_rate=args.stall_rate,
+        stall=args.stall,
+        verbose=True,
+    )
+    print(f"Serving {args.projects} projects x {args.locales} locales on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,26 @@
 #!/usr/bin/env python3
 
-import json
-import os
+import argparse
 import sys
-from urllib.parse import quote as urlquote
-from urllib.request import urlopen
 
+from pontoon_api import iter_localizations, projects_query
+
+# Localization fields used by this report
+FIELDS = ["unreviewedStrings"]
+
+
+def aggregate(pending_suggestions, project, element):
+    slug = project["slug"]
+    if slug in ["pontoon-intro", "tutorial"]:
+        return
+
+    locale = element["locale"]["code"]
+    if not locale in pending_suggestions:
+        pending_suggestions[locale] = 0
+    pending_suggestions[locale] += element["unreviewedStrings"]
 
-def main():
-    # Get completion stats for locales from Pontoon
-    query = """
-{
-    projects {
-        name
-        slug
-        localizations {
-            locale {
-                code
-            },
-            unreviewedStrings
-        }
-    }
-}
-"""
-    pending_suggestions = {}
-    try:
-        print("Reading Pontoon stats...")
-        url = f"https://pontoon.mozilla.org/graphql?query={urlquote(query)}&raw"
-        response = urlopen(url)
-        json_data = json.load(response)
-
-        for project in json_data["data"]["projects"]:
-            slug = project["slug"]
-            if slug in ["pontoon-intro", "tutorial"]:
-                continue
-
-            for element in project["localizations"]:
-                locale = element["locale"]["code"]
-                if not locale in pending_suggestions:
-                    pending_suggestions[locale] = 0
-                pending_suggestions[locale] += element["unreviewedStrings"]
-    except Exception as e:
-        print(e)
 
+def write_output(pending_suggestions, filename="output.csv"):
     output = []
     output.append("Locale,Pending Suggestions")
     # Only print requested locales
@@ -50,9 +28,40 @@ def main():
         output.append("{},{}".format(locale, pending_suggestions[locale]))
 
     # Save locally
-    with open("output.csv", "w") as f:
+    with open(filename, "w") as f:
         f.write("\n".join(output))
-        print("Data stored as output.csv")
+        print(f"Data stored as {filename}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Parse the Pontoon response while it's being downloaded",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=0,
+        help="Fetch projects one by one, with up to CONCURRENCY parallel requests",
+    )
+    args = parser.parse_args()
+
+    # Get completion stats for locales from Pontoon
+    pending_suggestions = {}
+    try:
+        print("Reading Pontoon stats...")
+        for project, element in iter_localizations(
+            projects_query(FIELDS), stream=args.stream, concurrency=args.concurrency
+        ):
+            aggregate(pending_suggestions, project, element)
+    except Exception as e:
+        # Partial counts would be misleading. A rerun starts over, except
+        # with --concurrency, where fetched projects are checkpointed.
+        sys.exit(f"Error reading Pontoon stats: {e}")
+
+    write_output(pending_suggestions)
 
 
 if __name__ == "__main__":
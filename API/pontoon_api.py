@@ -0,0 +1,808 @@
+"""
+Shared HTTP client for the scripts reading data from Pontoon's GraphQL API
+and from the GitHub API.
+
+* Connections are kept alive and reused for all requests to the same host.
+* Responses are requested gzip-compressed.
+* GraphQL responses are cached on disk for a few minutes, keyed by the
+  Pontoon instance and normalized query, so running several reports in a row
+  only downloads the same payload once.
+* The `projects { localizations }` payload can be parsed incrementally while
+  it's being downloaded (see iter_localizations), keeping memory flat, or
+  fetched one project at a time with a pool of concurrent requests.
+* Failed requests (network errors, timeouts, HTTP 429 and 5xx) are retried
+  with exponential backoff and jitter. After repeated failures, a circuit
+  breaker stops sending requests to the host for a while.
+* When running many queries (see query_many), successful responses are
+  checkpointed, so that a rerun after a failure only fetches missing ones.
+  This includes projects fetched one at a time; a single `projects` request
+  is only cached once complete, so a failed one starts over on the next run.
+* GitHub responses are cached with their ETag and requested conditionally.
+
+Usage:
+    from pontoon_api import query_pontoon
+
+    json_data = query_pontoon("{ projects { name slug } }")
+
+    for project, localization in iter_localizations(query, stream=True):
+        ...
+
+Environment variables:
+    PONTOON_URL             Pontoon instance (default: https://pontoon.mozilla.org)
+    GITHUB_API_URL          GitHub API (default: https://api.github.com)
+    GITHUB_TOKEN            GitHub token, for a higher rate limit (optional)
+    PONTOON_SCRIPTS_CACHE   Cache folder (default: ~/.cache/pontoon-scripts)
+    PONTOON_CACHE_TTL       Cache lifetime in seconds, 0 disables the cache
+                            (default: 600)
+    PONTOON_TIMEOUT         Timeout of each request in seconds (default: 60)
+    PONTOON_RETRIES         Retries of each failed request (default: 4)
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import quote as urlquote, urlsplit
+import codecs
+import gzip
+import hashlib
+import http.client
+import json
+import os
+import random
+import re
+import shutil
+import threading
+import time
+
+
+PONTOON_URL = os.environ.get("PONTOON_URL", "https://pontoon.mozilla.org").rstrip("/")
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com").rstrip(
+    "/"
+)
+CACHE_DIR = os.environ.get(
+    "PONTOON_SCRIPTS_CACHE",
+    os.path.join(
+        os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+        "pontoon-scripts",
+    ),
+)
+CACHE_TTL = int(os.environ.get("PONTOON_CACHE_TTL", 600))
+GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")
+# Checkpoints of incomplete runs are discarded after a day
+CHECKPOINT_TTL = 24 * 3600
+TIMEOUT = int(os.environ.get("PONTOON_TIMEOUT", 60))
+
+RETRIES = int(os.environ.get("PONTOON_RETRIES", 4))
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+BACKOFF = 1
+MAX_BACKOFF = 30
+
+# Consecutive failures opening the circuit breaker of a host, and seconds
+# before trying again.
+BREAKER_THRESHOLD = 8
+BREAKER_COOLDOWN = 30
+
+HEADERS = {
+    "Accept-Encoding": "gzip",
+    "User-Agent": "pontoon-scripts",
+}
+
+
+class APIError(Exception):
+    pass
+
+
+class RetryableError(APIError):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(APIError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Fail fast once a host failed `threshold` times in a row, until `cooldown`
+    seconds have passed. Then requests go through again, and a single failure
+    opens the circuit again.
+    """
+
+    def __init__(self, host, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.host = host
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def check(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.cooldown:
+                raise CircuitOpenError(
+                    f"Too many failed requests to {self.host}, giving up for now"
+                )
+            # Half-open: let requests through, one more failure opens it again
+            self.opened_at = None
+            self.failures = self.threshold - 1
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def _get_breaker(netloc):
+    with _breakers_lock:
+        if netloc not in _breakers:
+            _breakers[netloc] = CircuitBreaker(netloc)
+        return _breakers[netloc]
+
+
+def _backoff(attempt, retry_after=None):
+    """Delay before the next attempt: exponential backoff with full jitter."""
+    if retry_after is not None:
+        return min(retry_after, MAX_BACKOFF)
+    return random.uniform(0, min(MAX_BACKOFF, BACKOFF * 2**attempt))
+
+
+def _with_retries(url, func, retries=None):
+    """
+    Call func() until it succeeds, up to `retries` more times if it raises a
+    network error or a RetryableError.
+    """
+    retries = RETRIES if retries is None else retries
+    breaker = _get_breaker(urlsplit(url).netloc)
+
+    for attempt in range(retries + 1):
+        breaker.check()
+        try:
+            result = func()
+        except (OSError, http.client.HTTPException, RetryableError) as e:
+            breaker.failure()
+            if attempt == retries:
+                raise
+            time.sleep(_backoff(attempt, getattr(e, "retry_after", None)))
+        else:
+            breaker.success()
+            return result
+
+
+def _check_status(url, response):
+    if response.status in RETRY_STATUSES:
+        retry_after = response.getheader("Retry-After")
+        raise RetryableError(
+            f"HTTP {response.status} for {url}",
+            int(retry_after) if retry_after and retry_after.isdigit() else None,
+        )
+
+
+# http.client connections can't be shared between threads, so each thread
+# keeps its own set of open connections, one per host.
+_local = threading.local()
+
+
+def _get_connection(scheme, netloc):
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    key = (scheme, netloc)
+    if key not in connections:
+        if scheme == "https":
+            connections[key] = http.client.HTTPSConnection(netloc, timeout=TIMEOUT)
+        else:
+            connections[key] = http.client.HTTPConnection(netloc, timeout=TIMEOUT)
+
+    return connections[key]
+
+
+def _drop_connection(scheme, netloc):
+    connection = _local.connections.pop((scheme, netloc), None)
+    if connection is not None:
+        connection.close()
+
+
+def _request(url, headers=None):
+    parts = urlsplit(url)
+    target = parts.path or "/"
+    if parts.query:
+        target += f"?{parts.query}"
+    request_headers = dict(HEADERS, **(headers or {}))
+
+    # A kept-alive connection may have been closed by the server in the
+    # meantime: retry once on a fresh connection in that case. After any
+    # other error (e.g. a timeout), the connection is left in an unusable
+    # state, and is dropped before the request is retried by _with_retries.
+    for attempt in range(2):
+        connection = _get_connection(parts.scheme, parts.netloc)
+        try:
+            connection.request("GET", target, headers=request_headers)
+            return parts, connection.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionError):
+            _drop_connection(parts.scheme, parts.netloc)
+            if attempt:
+                raise
+        except (OSError, http.client.HTTPException):
+            _drop_connection(parts.scheme, parts.netloc)
+            raise
+
+
+def get(url, headers=None, retries=None):
+    """Return status, headers and (decompressed) body of a GET request."""
+
+    def attempt():
+        parts, response = _request(url, headers)
+        try:
+            body = response.read()
+            if response.getheader("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+        except Exception:
+            _drop_connection(parts.scheme, parts.netloc)
+            raise
+        if response.will_close:
+            _drop_connection(parts.scheme, parts.netloc)
+        _check_status(url, response)
+
+        return response.status, response.headers, body
+
+    return _with_retries(url, attempt, retries)
+
+
+@contextmanager
+def open_stream(url, headers=None, retries=None):
+    """
+    Context manager returning status and a file-like object reading the
+    (decompressed) body of a GET request as it arrives.
+
+    Only establishing the connection and getting the response status are
+    retried: errors while reading the body are left to the caller.
+    """
+
+    def attempt():
+        parts, response = _request(url, headers)
+        if response.status in RETRY_STATUSES:
+            try:
+                response.read()
+            except (OSError, http.client.HTTPException):
+                _drop_connection(parts.scheme, parts.netloc)
+                raise
+            _check_status(url, response)
+        return parts, response
+
+    parts, response = _with_retries(url, attempt, retries)
+    body = response
+    if response.getheader("Content-Encoding") == "gzip":
+        body = gzip.GzipFile(fileobj=response)
+
+    try:
+        yield response.status, body
+    finally:
+        # The connection can only be reused once the body was read entirely
+        if response.will_close or not response.isclosed():
+            _drop_connection(parts.scheme, parts.netloc)
+
+
+def get_json(url, headers=None):
+    status, _, body = get(url, headers)
+    if status != 200:
+        raise APIError(f"HTTP {status} for {url}")
+
+    return json.loads(body)
+
+
+def normalize_query(query):
+    """
+    Strip insignificant whitespace and commas from a GraphQL query, so that
+    the same query formatted differently shares the same cache entry.
+    """
+    query = re.sub(r"[\s,]+", " ", query).strip()
+    return re.sub(r" ?([{}():]) ?", r"\1", query)
+
+
+def _cache_path(query):
+    # Keyed by instance too, so that e.g. staging and production (or a local
+    # stand-in server) never share entries
+    key = hashlib.sha256(f"{PONTOON_URL}\n{query}".encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+
+def _fresh_cache_path(query, ttl):
+    """Return the path of the cache entry for query, if not expired."""
+    if ttl <= 0:
+        return None
+
+    path = _cache_path(query)
+    try:
+        if time.time() - os.path.getmtime(path) > ttl:
+            return None
+    except OSError:
+        return None
+
+    return path
+
+
+def _read_cache(query, ttl):
+    path = _fresh_cache_path(query, ttl)
+    if path is None:
+        return None
+
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _cache_tmp_path(query):
+    # Write to a temporary file first, so that concurrent runs never read a
+    # partially written cache entry.
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return f"{_cache_path(query)}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def _write_cache(query, body):
+    tmp_path = _cache_tmp_path(query)
+    with open(tmp_path, "wb") as f:
+        f.write(body)
+    os.replace(tmp_path, _cache_path(query))
+
+
+def query_pontoon(query, ttl=None, retries=None):
+    """Run a GraphQL query against Pontoon and return the decoded response."""
+    ttl = CACHE_TTL if ttl is None else ttl
+    query = normalize_query(query)
+
+    body = _read_cache(query, ttl)
+    if body is not None:
+        return json.loads(body)
+
+    url = f"{PONTOON_URL}/graphql?query={urlquote(query)}&raw"
+    status, _, body = get(url, retries=retries)
+    if status != 200:
+        raise APIError(f"HTTP {status} from Pontoon GraphQL API")
+
+    json_data = json.loads(body)
+    # Don't cache errors (e.g. unknown project)
+    if ttl > 0 and "errors" not in json_data:
+        _write_cache(query, body)
+
+    return json_data
+
+
+def get_github(path, query="", accept="application/vnd.github+json"):
+    """
+    Return the decoded response of a GitHub API request (JSON data, or text
+    for other media types set with `accept`).
+
+    Responses are stored in the cache folder with their ETag, and requested
+    again conditionally: 304 Not Modified responses don't count against the
+    rate limit.
+    """
+    url = f"{GITHUB_API_URL}{urlquote(path)}"
+    if query:
+        url += f"?{query}"
+    headers = {"Accept": accept}
+    if GITHUB_TOKEN:
+        headers["Authorization"] = f"Bearer {GITHUB_TOKEN}"
+
+    cache_path = os.path.join(
+        CACHE_DIR, "github", hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json"
+    )
+    cached = None
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+        headers["If-None-Match"] = cached["etag"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    status, response_headers, body = get(url, headers)
+    if status == 304 and cached is not None:
+        return cached["data"]
+    if status != 200:
+        raise APIError(f"HTTP {status} for {url}")
+
+    if accept.endswith("json"):
+        data = json.loads(body)
+    else:
+        data = body.decode("utf-8").strip()
+    etag = response_headers.get("ETag")
+    if etag:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"etag": etag, "data": data}, f)
+        os.replace(tmp_path, cache_path)
+
+    return data
+
+
+def get_github_tree_dirs(owner, repo):
+    """
+    Return the paths of all folders in the HEAD commit of a GitHub repository,
+    from a single recursive git trees request.
+
+    Trees are cached by commit SHA: as long as the repository doesn't change,
+    only a (conditional) request for the HEAD commit SHA is needed.
+    """
+    sha = get_github(
+        f"/repos/{owner}/{repo}/commits/HEAD", accept="application/vnd.github.sha"
+    )
+
+    cache_path = os.path.join(CACHE_DIR, "trees", f"{owner}_{repo}_{sha}.json")
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    tree = get_github(f"/repos/{owner}/{repo}/git/trees/{sha}", "recursive=1")
+    if tree.get("truncated"):
+        raise APIError(f"Tree of {owner}/{repo} is too large for the trees API")
+    dirs = [e["path"] for e in tree["tree"] if e["type"] == "tree"]
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(dirs, f)
+    os.replace(tmp_path, cache_path)
+
+    return dirs
+
+
+class _TeeReader:
+    """File-like wrapper copying everything read into another file."""
+
+    def __init__(self, source, copy):
+        self.source = source
+        self.copy = copy
+
+    def read(self, size=-1):
+        data = self.source.read(size)
+        self.copy.write(data)
+        return data
+
+
+class _JSONStreamParser:
+    """
+    Minimal incremental JSON reader: it walks the outer structure of a
+    document piece by piece, and only decodes the values it's asked for,
+    so that only one of them is held in memory at any given time.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+    WHITESPACE = " \t\n\r"
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        if self.eof:
+            return False
+
+        # Drop what was already consumed before growing the buffer
+        self.buffer = self.buffer[self.pos :]
+        self.pos = 0
+
+        chunk = self.stream.read(self.CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            self.buffer += self.text_decoder.decode(b"", final=True)
+            return False
+        self.buffer += self.text_decoder.decode(chunk)
+
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it."""
+        while True:
+            while self.pos < len(self.buffer):
+                if self.buffer[self.pos] not in self.WHITESPACE:
+                    return self.buffer[self.pos]
+                self.pos += 1
+            if not self._fill():
+                raise APIError("Unexpected end of JSON response")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise APIError(f"Unexpected character in JSON response: {self.peek()}")
+        self.pos += 1
+
+    def value(self):
+        """Decode and consume the next JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number at the end of the buffer might be truncated
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def items(self):
+        """Iterate over keys of the current object, value left unconsumed."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self.expect("}")
+                return
+
+    def elements(self):
+        """Iterate over elements of the current array, value left unconsumed."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self.expect("]")
+                return
+
+
+def _parse_localizations(stream):
+    parser = _JSONStreamParser(stream)
+
+    def find(keys, key):
+        for k in keys:
+            if k == key:
+                return
+            skip(k)
+        raise APIError(f"No {key} in GraphQL response")
+
+    def skip(key):
+        value = parser.value()
+        if key == "errors":
+            raise APIError(value)
+
+    response_keys = parser.items()
+    find(response_keys, "data")
+    data_keys = parser.items()
+    find(data_keys, "projects")
+    for _ in parser.elements():
+        project = {}
+        # Localizations might come before the project slug, in which case
+        # they need to be kept until the project is complete.
+        pending = []
+        for key in parser.items():
+            if key != "localizations":
+                project[key] = parser.value()
+                continue
+            for _ in parser.elements():
+                localization = parser.value()
+                if "slug" in project:
+                    yield project, localization
+                else:
+                    pending.append(localization)
+        for localization in pending:
+            yield project, localization
+
+    # Errors may also come after the data, e.g. with partial results
+    for key in data_keys:
+        skip(key)
+    for key in response_keys:
+        skip(key)
+
+
+def projects_query(fields):
+    """
+    Return a query for the given localization fields of all projects, e.g.
+    projects_query(["missingStrings", "totalStrings"]).
+    """
+    return (
+        "{projects{name slug localizations{locale{code} "
+        + " ".join(fields)
+        + "}}}"
+    )
+
+
+def _checkpoint_dir(queries):
+    # Keyed by instance too, like the cache (see _cache_path)
+    key = hashlib.sha256(
+        "\n".join([PONTOON_URL] + queries).encode("utf-8")
+    ).hexdigest()
+    return os.path.join(CACHE_DIR, "checkpoints", key)
+
+
+def _run_query(query, ttl, retries, checkpoint_dir):
+    if checkpoint_dir is None:
+        json_data = query_pontoon(query, ttl, retries)
+        if "errors" in json_data:
+            raise APIError(json_data["errors"])
+        return json_data["data"]
+
+    checkpoint = os.path.join(
+        checkpoint_dir, hashlib.sha256(query.encode("utf-8")).hexdigest() + ".json"
+    )
+    try:
+        with open(checkpoint, "rb") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    json_data = query_pontoon(query, ttl, retries)
+    if "errors" in json_data:
+        raise APIError(json_data["errors"])
+
+    # Concurrent runs may checkpoint the same query, see _cache_tmp_path
+    tmp_path = f"{checkpoint}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(json_data["data"], f)
+    os.replace(tmp_path, checkpoint)
+
+    return json_data["data"]
+
+
+def query_many(
+    queries, concurrency=8, retries=None, ttl=None, return_exceptions=False
+):
+    """
+    Run GraphQL queries with up to `concurrency` parallel requests, and yield
+    the `data` of each response in the same order as queries.
+
+    Each query is retried on its own up to `retries` times. Successful
+    responses are checkpointed until all queries succeed: if some queries
+    still fail, the others are completed anyway, an APIError is raised at
+    the end, and running the same queries again only fetches failed ones.
+    With ttl <= 0, nothing is checkpointed (or read from checkpoints).
+
+    With return_exceptions=True, the exception of a failed query is yielded
+    in place of its data instead, and no error is raised at the end.
+    """
+    queries = [normalize_query(query) for query in queries]
+    ttl = CACHE_TTL if ttl is None else ttl
+    checkpoint_dir = None
+    if ttl > 0:
+        checkpoint_dir = _checkpoint_dir(queries)
+        try:
+            if time.time() - os.path.getmtime(checkpoint_dir) > CHECKPOINT_TTL:
+                shutil.rmtree(checkpoint_dir)
+        except OSError:
+            pass
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    errors = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(_run_query, query, ttl, retries, checkpoint_dir)
+            for query in queries
+        ]
+        try:
+            for query, future in zip(queries, futures):
+                try:
+                    data = future.result()
+                except Exception as e:
+                    errors.append(f"{query}: {e}")
+                    if return_exceptions:
+                        yield e
+                    continue
+                yield data
+        finally:
+            # Also runs when the caller stops iterating early: remaining
+            # queries are still completed, and checkpoints are only removed
+            # once all of them succeeded.
+            executor.shutdown()
+            if checkpoint_dir and not any(future.exception() for future in futures):
+                shutil.rmtree(checkpoint_dir, ignore_errors=True)
+
+    if errors and not return_exceptions:
+        raise APIError(
+            f"{len(errors)} of {len(queries)} queries failed, run again to "
+            "fetch only the missing ones:\n" + "\n".join(errors)
+        )
+
+
+def iter_project_shards(query, concurrency=8, retries=None, ttl=None):
+    """
+    Split a `{ projects { ... } }` query into one `project(slug)` query per
+    project, run them with up to `concurrency` parallel requests and yield
+    projects (in slug order) as they complete.
+
+    Each project is retried on its own, and only failed projects are fetched
+    again on the next run (see query_many).
+    """
+    query = normalize_query(query)
+    if not (query.startswith("{projects{") and query.endswith("}}")):
+        raise ValueError("Only `{ projects { ... } }` queries can be sharded")
+    project_query = query[len("{projects") : -1]
+
+    json_data = query_pontoon("{projects{slug}}", ttl, retries)
+    slugs = sorted(project["slug"] for project in json_data["data"]["projects"])
+    shard_queries = [f'{{project(slug:"{slug}"){project_query}}}' for slug in slugs]
+
+    for data in query_many(shard_queries, concurrency, retries, ttl):
+        yield data["project"]
+
+
+def iter_localizations(query, stream=False, concurrency=0, ttl=None):
+    """
+    Run a `projects { ... localizations { ... } }` query and yield
+    (project, localization) pairs.
+
+    With stream=True, the response is parsed incrementally while it's being
+    downloaded (or read from the cache), instead of being loaded in memory
+    as a whole. In that case, project only contains the fields requested
+    before `localizations`.
+
+    With concurrency > 0, projects are fetched one by one instead, using up
+    to `concurrency` parallel requests (see iter_project_shards). This is the
+    only mode that can resume after a failure: otherwise, the response is
+    only cached once complete, and fetched again as a whole on the next run.
+    """
+    if concurrency > 0:
+        for project in iter_project_shards(query, concurrency, ttl=ttl):
+            for localization in project["localizations"]:
+                yield project, localization
+        return
+
+    if not stream:
+        json_data = query_pontoon(query, ttl)
+        if "errors" in json_data:
+            raise APIError(json_data["errors"])
+        for project in json_data["data"]["projects"]:
+            for localization in project["localizations"]:
+                yield project, localization
+        return
+
+    ttl = CACHE_TTL if ttl is None else ttl
+    query = normalize_query(query)
+
+    cache_path = _fresh_cache_path(query, ttl)
+    if cache_path is not None:
+        with open(cache_path, "rb") as f:
+            yield from _parse_localizations(f)
+        return
+
+    url = f"{PONTOON_URL}/graphql?query={urlquote(query)}&raw"
+    with open_stream(url) as (status, body):
+        if status != 200:
+            raise APIError(f"HTTP {status} from Pontoon GraphQL API")
+        if ttl <= 0:
+            yield from _parse_localizations(body)
+            return
+
+        tmp_path = _cache_tmp_path(query)
+        try:
+            with open(tmp_path, "wb") as copy:
+                yield from _parse_localizations(_TeeReader(body, copy))
+                # Store the rest of the response too (if any)
+                while copy.write(body.read(_JSONStreamParser.CHUNK_SIZE)):
+                    pass
+            # As in query_pontoon, errors aren't cached: the parser raises
+            # APIError on an `errors` key, wherever it is in the response
+            os.replace(tmp_path, _cache_path(query))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
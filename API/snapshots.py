@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+"""
+Store timestamped snapshots of Pontoon localization stats (locale x project
+matrix of approved, warnings, missing, pretranslated, unreviewed and total
+strings), and compare them locally to track trends.
+
+Snapshots are stored as compressed NumPy files (.npz). Requires numpy.
+
+Usage:
+    # Fetch current stats and store them in the snapshots folder
+    python snapshots.py save
+
+    # List available snapshots
+    python snapshots.py list
+
+    # Change in missing and unreviewed strings per locale between the two
+    # most recent snapshots, or between two given snapshots
+    python snapshots.py delta
+    python snapshots.py delta old.npz new.npz --fields missing --projects firefox
+"""
+
+from glob import glob
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from pontoon_api import iter_localizations, projects_query
+from stats_matrix import FIELDS, StatsMatrix
+
+
+def snapshot_files(snapshot_dir):
+    return sorted(glob(os.path.join(snapshot_dir, "snapshot-*.npz")))
+
+
+def save(args):
+    print("Reading Pontoon stats...")
+    matrix = StatsMatrix.from_localizations(
+        iter_localizations(projects_query(FIELDS.values()), stream=args.stream)
+    )
+
+    os.makedirs(args.snapshot_dir, exist_ok=True)
+    filename = os.path.join(
+        args.snapshot_dir, f"snapshot-{matrix.timestamp:%Y%m%dT%H%M%S}.npz"
+    )
+    matrix.save(filename)
+    print(
+        f"Stats for {len(matrix.locales)} locales and {len(matrix.projects)} "
+        f"projects stored as {filename}"
+    )
+
+
+def list_snapshots(args):
+    for filename in snapshot_files(args.snapshot_dir):
+        matrix = StatsMatrix.load(filename)
+        print(
+            f"{filename}: {matrix.timestamp:%Y-%m-%d %H:%M:%S}, "
+            f"{len(matrix.locales)} locales, {len(matrix.projects)} projects"
+        )
+
+
+def delta(args):
+    if args.snapshots:
+        if len(args.snapshots) != 2:
+            sys.exit("Specify two snapshots to compare.")
+        old_file, new_file = args.snapshots
+    else:
+        files = snapshot_files(args.snapshot_dir)
+        if len(files) < 2:
+            sys.exit(f"At least two snapshots are needed in {args.snapshot_dir}.")
+        old_file, new_file = files[-2:]
+
+    old = StatsMatrix.load(old_file)
+    new = StatsMatrix.load(new_file)
+
+    # Align both snapshots on the union of their locales and projects
+    locales = sorted(set(old.locales) | set(new.locales))
+    projects = sorted(set(old.projects) | set(new.projects))
+    old = old.reindex(locales, projects)
+    new = new.reindex(locales, projects)
+
+    columns = []
+    header = ["Locale"]
+    for name in args.fields:
+        before = old.totals(name, args.projects)
+        after = new.totals(name, args.projects)
+        columns += [before, after, after - before]
+        header += [f"{name} before", f"{name} after", f"{name} change"]
+    table = np.column_stack(columns)
+
+    # Sort by largest absolute change of the first field
+    order = np.argsort(-np.abs(table[:, 2]), kind="stable")
+    if not args.all:
+        order = order[np.any(table[order][:, 2::3] != 0, axis=1)]
+
+    output = [",".join(header)]
+    for i in order:
+        output.append(",".join([locales[i]] + [str(v) for v in table[i]]))
+
+    print(
+        f"Changes between {old.timestamp:%Y-%m-%d %H:%M} and "
+        f"{new.timestamp:%Y-%m-%d %H:%M}: {len(order)} locales"
+    )
+    with open(args.output, "w") as f:
+        f.write("\n".join(output))
+        print(f"Data stored as {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--snapshot-dir",
+        default="snapshots",
+        help="Folder storing snapshots (default: snapshots)",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    save_parser = subparsers.add_parser("save", help="Store a new snapshot")
+    save_parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Parse the Pontoon response while it's being downloaded",
+    )
+    save_parser.set_defaults(func=save)
+
+    list_parser = subparsers.add_parser("list", help="List stored snapshots")
+    list_parser.set_defaults(func=list_snapshots)
+
+    delta_parser = subparsers.add_parser(
+        "delta", help="Compare two snapshots (default: the two most recent)"
+    )
+    delta_parser.add_argument(
+        "snapshots", nargs="*", help="Old and new snapshot files to compare"
+    )
+    delta_parser.add_argument(
+        "--fields",
+        nargs="+",
+        choices=FIELDS.keys(),
+        default=["missing", "unreviewed"],
+        help="Fields to compare (default: missing unreviewed)",
+    )
+    delta_parser.add_argument(
+        "--projects",
+        nargs="+",
+        help="Only compare stats of these projects (default: all)",
+    )
+    delta_parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Include locales without changes",
+    )
+    delta_parser.add_argument(
+        "--output",
+        default="output.csv",
+        help="CSV file to store the comparison in (default: output.csv)",
+    )
+    delta_parser.set_defaults(func=delta)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
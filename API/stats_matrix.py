@@ -0,0 +1,132 @@
+"""
+Dense locale x project matrix of Pontoon localization stats, backed by NumPy
+arrays, with storage as compressed .npz files.
+
+Requires numpy (pip install numpy).
+
+Usage:
+    from pontoon_api import iter_localizations, projects_query
+    from stats_matrix import FIELDS, StatsMatrix
+
+    matrix = StatsMatrix.from_localizations(
+        iter_localizations(projects_query(FIELDS.values()))
+    )
+    missing_per_locale = matrix.totals("missing")
+"""
+
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Matrix field name: Pontoon localization field
+FIELDS = {
+    "approved": "approvedStrings",
+    "warnings": "stringsWithWarnings",
+    "missing": "missingStrings",
+    "pretranslated": "pretranslatedStrings",
+    "unreviewed": "unreviewedStrings",
+    "total": "totalStrings",
+}
+
+
+class StatsMatrix:
+    """
+    Stats of each field are stored in a (locales x projects) integer array.
+    `present` flags which locales are enabled in which projects, other cells
+    are 0.
+    """
+
+    def __init__(self, locales, projects, values, present, timestamp=None):
+        self.locales = list(locales)
+        self.projects = list(projects)
+        self.values = values
+        self.present = present
+        self.timestamp = timestamp or datetime.now(timezone.utc)
+
+    @classmethod
+    def from_localizations(cls, localizations, fields=FIELDS):
+        """Build a matrix from (project, localization) pairs."""
+        locales = {}
+        projects = {}
+        rows = []
+        columns = []
+        columns_values = {name: [] for name in fields}
+
+        for project, element in localizations:
+            rows.append(locales.setdefault(element["locale"]["code"], len(locales)))
+            columns.append(projects.setdefault(project["slug"], len(projects)))
+            for name, field in fields.items():
+                columns_values[name].append(element[field])
+
+        shape = (len(locales), len(projects))
+        present = np.zeros(shape, dtype=bool)
+        present[rows, columns] = True
+        values = {}
+        for name in fields:
+            values[name] = np.zeros(shape, dtype=np.int64)
+            values[name][rows, columns] = columns_values[name]
+
+        return cls(locales, projects, values, present)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            values = {
+                key[len("values_") :]: data[key]
+                for key in data.files
+                if key.startswith("values_")
+            }
+            return cls(
+                data["locales"].tolist(),
+                data["projects"].tolist(),
+                values,
+                data["present"],
+                datetime.fromisoformat(str(data["timestamp"])),
+            )
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            locales=np.array(self.locales),
+            projects=np.array(self.projects),
+            present=self.present,
+            timestamp=np.array(self.timestamp.isoformat()),
+            **{f"values_{name}": array for name, array in self.values.items()},
+        )
+
+    def reindex(self, locales, projects):
+        """
+        Return a copy of the matrix with the given locales and projects, in
+        that order. Cells of locales or projects unknown to this matrix are 0.
+        """
+        locale_index = {locale: i for i, locale in enumerate(self.locales)}
+        project_index = {project: i for i, project in enumerate(self.projects)}
+        rows = np.array([locale_index.get(locale, -1) for locale in locales])
+        columns = np.array([project_index.get(project, -1) for project in projects])
+
+        # Use an extra empty row and column for missing labels (index -1)
+        def take(array):
+            padded = np.pad(array, ((0, 1), (0, 1)))
+            return padded[np.ix_(rows, columns)]
+
+        return StatsMatrix(
+            locales,
+            projects,
+            {name: take(array) for name, array in self.values.items()},
+            take(self.present),
+            self.timestamp,
+        )
+
+    def project_mask(self, projects=None):
+        """Boolean mask of the given projects' columns (all if None)."""
+        if projects is None:
+            return np.ones(len(self.projects), dtype=bool)
+        return np.isin(np.array(self.projects), list(projects))
+
+    def totals(self, name, projects=None):
+        """Per-locale sum of the given field over projects (all if None)."""
+        return self.values[name][:, self.project_mask(projects)].sum(axis=1)
+
+    def project_counts(self, projects=None):
+        """Number of the given projects each locale is enabled in."""
+        return self.present[:, self.project_mask(projects)].sum(axis=1)
@@ -0,0 +1,118 @@
+"""
+Analyze Heroku router logs in a single pass: each line is parsed once, and
+all the reports are produced from the same read of the log:
+* IPs with the most requests
+* Paths requested most by each of those IPs
+* Status code mix, overall and for each of those IPs
+* Bytes sent and mean service time for each of those IPs
+
+This replaces running check_ips_heroku_log.py, then check_urls_ip_heroku_log.py
+once per IP.
+
+Download a portion of the log from Heroku and save it locally, e.g.
+
+timeout 60 heroku logs --tail --app mozilla-pontoon > log.txt
+
+Usage:
+    python analyze_heroku_log.py log.txt
+    python analyze_heroku_log.py --top 20 --paths 10 log.txt.gz
+    heroku logs --tail --app mozilla-pontoon | python analyze_heroku_log.py -
+"""
+
+from collections import Counter, defaultdict
+import argparse
+
+from heroku_log import check_log_file, open_log, parse_router_line
+
+
+def format_status_mix(statuses):
+    total = sum(statuses.values())
+    return ", ".join(
+        f"{status}: {count} ({count / total:.0%})"
+        for status, count in sorted(statuses.items(), key=lambda item: str(item[0]))
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "log_file",
+        help="Path to log file, or - to read from stdin",
+    )
+    parser.add_argument(
+        "--top",
+        required=False,
+        type=int,
+        default=10,
+        help="Number of IPs to report",
+    )
+    parser.add_argument(
+        "--paths",
+        required=False,
+        type=int,
+        default=5,
+        help="Number of paths to report for each IP",
+    )
+    parser.add_argument(
+        "--threshold",
+        required=False,
+        type=int,
+        default=10,
+        help="Threshold under which IPs are ignored",
+    )
+    args = parser.parse_args()
+    log_file = args.log_file
+
+    check_log_file(log_file)
+
+    requests = 0
+    statuses = Counter()
+    ips = Counter()
+    ip_paths = defaultdict(Counter)
+    ip_statuses = defaultdict(Counter)
+    ip_bytes = Counter()
+    ip_service = Counter()
+
+    with open_log(log_file) as f:
+        for line in f:
+            record = parse_router_line(line)
+            if record is None:
+                continue
+
+            requests += 1
+            statuses[record.status] += 1
+            ips[record.ip] += 1
+            ip_paths[record.ip][record.path] += 1
+            ip_statuses[record.ip][record.status] += 1
+            ip_bytes[record.ip] += record.bytes or 0
+            ip_service[record.ip] += record.service or 0
+
+    print(f"Router requests: {requests}")
+    if not requests:
+        return
+    print(f"Status mix: {format_status_mix(statuses)}")
+
+    top_ips = [
+        (ip, count)
+        for ip, count in ips.most_common(args.top)
+        if count >= args.threshold
+    ]
+
+    print("\nIPs with high activity:")
+    if not top_ips:
+        print("  -")
+    for ip, count in top_ips:
+        print(f"  {ip}: {count}")
+
+    for ip, count in top_ips:
+        print(
+            f"\n{ip} ({count} requests, {ip_bytes[ip] / 1024 / 1024:.1f} MiB, "
+            f"mean service time {ip_service[ip] / count:.0f} ms)"
+        )
+        print(f"  Status mix: {format_status_mix(ip_statuses[ip])}")
+        for path, path_count in ip_paths[ip].most_common(args.paths):
+            print(f"  Path ({path_count}): {path}")
+
+
+if __name__ == "__main__":
+    main()
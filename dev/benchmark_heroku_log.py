@@ -0,0 +1,189 @@
+"""
+Benchmark the Heroku log analysis scripts on a synthetic log, generated with
+generate_heroku_log.py.
+
+Each script runs in a subprocess, and the harness reports wall time, lines
+processed per second and peak RSS of the process.
+
+Usage:
+    python benchmark_heroku_log.py
+    python benchmark_heroku_log.py --lines 10000000 --filter check_ips
+    python benchmark_heroku_log.py --log existing_log.txt --repeat 3
+"""
+
+from collections import Counter
+from multiprocessing import Pool
+from os.path import abspath, dirname, getsize, join
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from generate_heroku_log import make_ips
+from heroku_log import open_log, parse_router_line
+
+DEV_DIR = dirname(abspath(__file__))
+
+# (label, script, arguments): {log} is the log file, {gz} the same compressed,
+# {ip} the most active IP, {subnet} its /24 (or /64) network, {db} a new
+# SQLite database. Scripts reading from `-` get the log on stdin.
+SCRIPTS = [
+    ("check_ips", "check_ips_heroku_log.py", ["{log}"]),
+    ("check_ips --jobs 0", "check_ips_heroku_log.py", ["--jobs", "0", "{log}"]),
+    (
+        "check_ips --subnets --suggest",
+        "check_ips_heroku_log.py",
+        ["--subnets", "--suggest", "{log}"],
+    ),
+    ("check_ips (gzip)", "check_ips_heroku_log.py", ["{gz}"]),
+    ("check_urls_ip", "check_urls_ip_heroku_log.py", ["--ip", "{ip}", "{log}"]),
+    (
+        "check_urls_ip --exact",
+        "check_urls_ip_heroku_log.py",
+        ["--exact", "--ip", "{ip}", "{log}"],
+    ),
+    (
+        "check_urls_ip --jobs 0",
+        "check_urls_ip_heroku_log.py",
+        ["--jobs", "0", "--ip", "{ip}", "{log}"],
+    ),
+    (
+        "check_urls_ip (subnet)",
+        "check_urls_ip_heroku_log.py",
+        ["--ip", "{subnet}", "{log}"],
+    ),
+    ("analyze", "analyze_heroku_log.py", ["{log}"]),
+    ("latency", "latency_heroku_log.py", ["{log}"]),
+    ("latency --jobs 0", "latency_heroku_log.py", ["--jobs", "0", "{log}"]),
+    ("check_ips --follow", "check_ips_heroku_log.py", ["--follow", "-"]),
+    (
+        "heroku_log_store ingest",
+        "heroku_log_store.py",
+        ["--db", "{db}", "ingest", "{log}"],
+    ),
+]
+
+
+def run_script(script, arguments, input_file=None):
+    """
+    Run script, with input_file piped to stdin if set (as with `heroku logs
+    --tail`), and return wall time (s), peak RSS (MiB), exit status.
+    """
+    start = time.perf_counter()
+    feeder = None
+    if input_file:
+        feeder = subprocess.Popen(["cat", input_file], stdout=subprocess.PIPE)
+    process = subprocess.Popen(
+        [sys.executable, join(DEV_DIR, script)] + arguments,
+        stdin=feeder.stdout if feeder else None,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    if feeder:
+        feeder.stdout.close()
+    # wait4 returns the resource usage of this child only (with --jobs, the
+    # largest of the workers and the main process)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    if feeder:
+        feeder.wait()
+
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    rss = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+    return elapsed, rss, os.waitstatus_to_exitcode(status)
+
+
+def most_active_ip(log_file):
+    with open_log(log_file) as f:
+        ips = Counter(record.ip for record in map(parse_router_line, f) if record)
+    return ips.most_common(1)[0][0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--lines", type=int, default=1000000, help="Number of log lines to generate"
+    )
+    parser.add_argument(
+        "--ipv6", type=float, default=0.1, help="Fraction of IPv6 clients"
+    )
+    parser.add_argument(
+        "--log",
+        required=False,
+        help="Benchmark on an existing uncompressed log instead",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="Number of runs for each script"
+    )
+    parser.add_argument(
+        "--filter", default="", help="Only run scripts whose label contains FILTER"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Work in subprocesses: children start with the peak RSS of the
+        # parent, which must stay small for measures to be meaningful
+        if args.log:
+            log_file = abspath(args.log)
+            with Pool(1) as pool:
+                ip = pool.apply(most_active_ip, (log_file,))
+        else:
+            log_file = join(tmp_dir, "log.txt")
+            print(f"Generating {args.lines} lines...")
+            subprocess.run(
+                [
+                    sys.executable,
+                    join(DEV_DIR, "generate_heroku_log.py"),
+                    f"--lines={args.lines}",
+                    f"--ipv6={args.ipv6}",
+                    f"--output={log_file}",
+                ],
+                check=True,
+            )
+            # Same seed: the first IP, most active, is the same
+            ip = make_ips(1, ipv6=args.ipv6)[0]
+
+        gz_file = join(tmp_dir, "log.txt.gz")
+        with open(gz_file, "wb") as f:
+            subprocess.run(["gzip", "-1", "-c", log_file], stdout=f, check=True)
+        with open(log_file, "rb") as f:
+            lines = sum(1 for _ in f)
+        placeholders = {
+            "{log}": log_file,
+            "{gz}": gz_file,
+            "{ip}": ip,
+            "{subnet}": f"{ip}/{24 if '.' in ip else 64}",
+        }
+
+        print(f"{lines} lines, {getsize(log_file) / 1024 / 1024:.0f} MiB\n")
+        print(f"{'Script':<36} {'Wall (s)':>9} {'Lines/s':>10} {'RSS (MiB)':>10}")
+        for label, script, arguments in SCRIPTS:
+            if args.filter not in label:
+                continue
+
+            for run in range(args.repeat):
+                placeholders["{db}"] = join(tmp_dir, f"store-{run}.sqlite3")
+                run_arguments = []
+                for argument in arguments:
+                    for key, value in placeholders.items():
+                        argument = argument.replace(key, value)
+                    run_arguments.append(argument)
+
+                elapsed, rss, exit_code = run_script(
+                    script, run_arguments, log_file if "-" in arguments else None
+                )
+
+                line = (
+                    f"{label:<36} {elapsed:>9.2f} {lines / elapsed:>10.0f} "
+                    f"{rss:>10.1f}"
+                )
+                if exit_code:
+                    line += f"  (exit code {exit_code})"
+                print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,7 +15,7 @@ seconds instead.
 Alternative methods here: https://devcenter.heroku.com/articles/logging#view-logs
 
 2) Populate `blocked_ip_setting` with the IPs stored in the mozilla-pontoon app
-settings.
+settings (or pass them with --blocked-ips).
 
 Open https://dashboard.heroku.com/apps/mozilla-pontoon/resources
 
@@ -27,20 +27,181 @@ value as is.
 Usage:
     python check_ips_heroku_log.py log.txt
     python check_ips_heroku_log.py --threshold 50 log.txt
+    python check_ips_heroku_log.py log.txt.gz
+    heroku logs --tail --app mozilla-pontoon | python check_ips_heroku_log.py -
+    python check_ips_heroku_log.py --jobs 8 huge_log.txt
+
+    # Simulate a proposed BLOCKED_IPS setting against the log
+    python check_ips_heroku_log.py --blocked-ips "1.2.3.4, 5.6.0.0/16" log.txt
+
+    # Aggregate by subnet, and suggest ranges to add to BLOCKED_IPS
+    python check_ips_heroku_log.py --subnets --suggest log.txt
+
+    # Flag IPs and subnets with more than 300 requests in the last 60 seconds,
+    # continuously (Ctrl+C to stop)
+    heroku logs --tail --app mozilla-pontoon | python check_ips_heroku_log.py --follow --rate 300 -
+
+--subnets aggregates requests by /16 and /24 (IPv4), /48 and /64 (IPv6).
+
+--suggest computes the minimal set of ranges covering all the IPs above the
+threshold, such that at most --max-collateral of the requests in each range
+come from other IPs (ranges are never broader than /16 or /48), and prints
+a BLOCKED_IPS value including them, ready to paste in the Heroku settings.
+
+The log is read line by line, so memory only depends on the number of
+distinct IPs. Compressed logs (.gz, .zst) are supported. For large
+uncompressed logs, --jobs scans chunks of the file in parallel processes.
 """
 
-from ipaddress import ip_address, ip_network
-from os.path import isfile
+from collections import defaultdict
+from ipaddress import ip_address
 import argparse
 import re
-import sys
+import time
+
+from heavy_hitters import SlidingWindow
+from heroku_log import (
+    check_log_file,
+    follow_log,
+    open_log,
+    parallel_count,
+    parse_router_line,
+    parse_timestamp,
+)
+from ip_blocklist import SUBNET_PREFIXES, Blocklist, subnet, suggest_ranges
+
+# First address of the fwd field, IPv4 or IPv6
+FWD_IP = r"fwd=\"([\da-fA-F.:]+)"
+
+
+def print_subnets(ips, threshold):
+    """Print subnets with at least threshold requests, for each prefix length."""
+    requests = defaultdict(lambda: defaultdict(int))
+    distinct_ips = defaultdict(int)
+    for ip, count in ips.items():
+        try:
+            version = ip_address(ip).version
+        except ValueError:
+            continue
+        for prefix in SUBNET_PREFIXES[version]:
+            network = subnet(ip, prefix)
+            requests[(version, prefix)][network] += count
+            distinct_ips[network] += 1
+
+    for version, prefixes in SUBNET_PREFIXES.items():
+        for prefix in prefixes:
+            top = [
+                item
+                for item in requests[(version, prefix)].items()
+                if item[1] >= threshold
+            ]
+            top.sort(key=lambda item: item[1], reverse=True)
+
+            print(f"\nIPv{version} /{prefix} subnets with high activity:")
+            if not top:
+                print("  -")
+            for network, count in top:
+                print(f"  {network}: {count} ({distinct_ips[network]} IPs)")
+
+
+def print_suggestions(ips, threshold, max_collateral, blocklist):
+    # Single IPs are listed without prefix length, as in BLOCKED_IPS
+    suggestions = [
+        str(network.network_address)
+        if network.prefixlen == network.max_prefixlen
+        else str(network)
+        for network in suggest_ranges(ips, threshold, max_collateral)
+    ]
+
+    print("\nSuggested ranges to block:")
+    if not suggestions:
+        print("  -")
+        return
+
+    # Match each IP once against all the suggested ranges
+    suggested = Blocklist(", ".join(suggestions))
+    offending_ips = defaultdict(int)
+    offending = defaultdict(int)
+    benign = defaultdict(int)
+    for ip, count in ips.items():
+        entry = suggested.match(ip)
+        if entry is None:
+            continue
+        if count >= threshold:
+            offending_ips[entry] += 1
+            offending[entry] += count
+        else:
+            benign[entry] += count
+
+    for entry in suggestions:
+        print(
+            f"  {entry}: {offending[entry]} requests from {offending_ips[entry]} "
+            f"IPs, {benign[entry]} from other IPs"
+        )
+
+    print("\nBLOCKED_IPS:")
+    print(", ".join(blocklist.entries + suggestions))
+
+
+def follow(log_file, blocklist, window, rate, subnet_rate, capacity):
+    """
+    Read the log continuously and flag IPs and subnets crossing the rate
+    threshold within the sliding window, using constant memory.
+    """
+    ips = SlidingWindow(window, capacity=capacity)
+    subnets = SlidingWindow(window, capacity=capacity)
+    # Keys already flagged, and when: flag them again once the window passed
+    flagged = {}
+
+    print(
+        f"Following {log_file}, flagging more than {rate} requests per IP "
+        f"and {subnet_rate} per subnet in {window} seconds (Ctrl+C to stop)"
+    )
+    try:
+        with open_log(log_file) as f:
+            for line in follow_log(f):
+                record = parse_router_line(line)
+                if record is None or record.ip in blocklist:
+                    continue
+                timestamp = parse_timestamp(record.timestamp) or time.time()
+
+                for key, sketch, threshold in [
+                    (record.ip, ips, rate),
+                    (subnet(record.ip), subnets, subnet_rate),
+                ]:
+                    if key is None:
+                        continue
+                    sketch.add(key, timestamp)
+                    if timestamp - flagged.get(key, -window) < window:
+                        continue
+                    count = sketch.count(key)
+                    if count >= threshold:
+                        flagged[key] = timestamp
+                        print(f"[{record.timestamp}] {key}: {count} requests")
+
+                # Keep the set of flagged keys bounded too
+                if len(flagged) > 2 * capacity:
+                    flagged = {
+                        key: flagged_at
+                        for key, flagged_at in flagged.items()
+                        if timestamp - flagged_at < window
+                    }
+    except KeyboardInterrupt:
+        pass
+
+    print("\nIPs with high activity in the last window:")
+    for ip, count in ips.top(10):
+        print(f"  {ip}: {count}")
+    print("\nSubnets with high activity in the last window:")
+    for network, count in subnets.top(10):
+        print(f"  {network}: {count}")
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "log_file",
-        help="Path to log file",
+        help="Path to log file, or - to read from stdin",
     )
     parser.add_argument(
         "--threshold",
@@ -48,54 +209,123 @@ def main():
         default=10,
         help="Threshold under which IPs are ignored",
     )
+    parser.add_argument(
+        "--jobs",
+        required=False,
+        type=int,
+        default=1,
+        help="Number of processes scanning the log in parallel (0: all CPUs)",
+    )
+    parser.add_argument(
+        "--blocked-ips",
+        required=False,
+        help="Value of BLOCKED_IPS to check against (default: blocked_ip_setting)",
+    )
+    parser.add_argument(
+        "--follow",
+        required=False,
+        action="store_true",
+        help="Read the log continuously and flag IPs exceeding --rate",
+    )
+    parser.add_argument(
+        "--window",
+        required=False,
+        type=int,
+        default=60,
+        help="Sliding window for --follow, in seconds",
+    )
+    parser.add_argument(
+        "--rate",
+        required=False,
+        type=int,
+        default=300,
+        help="Requests per IP within the window flagged by --follow",
+    )
+    parser.add_argument(
+        "--subnet-rate",
+        required=False,
+        type=int,
+        help="Requests per /24 (IPv4) or /64 (IPv6) subnet within the window "
+        "flagged by --follow (default: 3 times --rate)",
+    )
+    parser.add_argument(
+        "--capacity",
+        required=False,
+        type=int,
+        default=1000,
+        help="Number of IPs and subnets tracked by --follow (bounds memory)",
+    )
+    parser.add_argument(
+        "--subnets",
+        required=False,
+        action="store_true",
+        help="Aggregate requests by /16, /24 (IPv4) and /48, /64 (IPv6) subnets",
+    )
+    parser.add_argument(
+        "--suggest",
+        required=False,
+        action="store_true",
+        help="Suggest ranges covering IPs above the threshold, and print the "
+        "resulting BLOCKED_IPS value",
+    )
+    parser.add_argument(
+        "--max-collateral",
+        required=False,
+        type=float,
+        default=0.05,
+        help="Maximum share of requests from IPs below the threshold in each "
+        "range suggested by --suggest (default: 0.05)",
+    )
     args = parser.parse_args()
     threshold = int(args.threshold)
     log_file = args.log_file
 
-    if not isfile(log_file):
-        sys.exit(f"File {log_file} doesn't exist.")
+    check_log_file(log_file)
 
     ips = {}
-    filter = re.compile(r"fwd=\"([\d.]+)\"")
+    filter = re.compile(FWD_IP)
 
     # Copy from Heroku settings
     blocked_ip_setting = ""
+    if args.blocked_ips is not None:
+        blocked_ip_setting = args.blocked_ips
 
-    BLOCKED_IPS = []
-    BLOCKED_IP_RANGES = []
-    for ip in blocked_ip_setting.split(","):
-        ip = ip.strip()
-        if ip == "":
-            continue
-        try:
-            # If the IP is valid, store it directly as string
-            ip_obj = ip_address(ip)
-            BLOCKED_IPS.append(ip)
-        except ValueError:
-            try:
-                # Check if it's a valid IP range (CIDR notation)
-                ip_obj = ip_network(ip, strict=False)
-                BLOCKED_IP_RANGES.append(ip_obj)
-            except ValueError:
-                print(f"Invalid IP or IP range defined in BLOCKED_IPS: {ip}")
-
-    with open(log_file) as f:
-        content = f.readlines()
-        for line in content:
-            match = filter.search(line)
-            if match:
-                ip = match.group(1)
-                if ip not in ips:
-                    ips[ip] = 1
-                else:
-                    ips[ip] += 1
-
-    sorted_ips = dict(sorted(ips.items(), key=lambda item: item[1], reverse=True))
+    blocklist = Blocklist(blocked_ip_setting)
+    for ip in blocklist.invalid:
+        print(f"Invalid IP or IP range defined in BLOCKED_IPS: {ip}")
+
+    if args.follow:
+        follow(
+            log_file,
+            blocklist,
+            args.window,
+            args.rate,
+            args.subnet_rate or 3 * args.rate,
+            args.capacity,
+        )
+        return
+
+    if args.jobs != 1:
+        ips = parallel_count(log_file, FWD_IP.encode(), jobs=args.jobs)
+    else:
+        with open_log(log_file) as f:
+            for line in f:
+                match = filter.search(line)
+                if match:
+                    ip = match.group(1)
+                    if ip not in ips:
+                        ips[ip] = 1
+                    else:
+                        ips[ip] += 1
+
+    # Ties sorted by IP, so that the output is the same with --jobs
+    sorted_ips = dict(sorted(ips.items(), key=lambda item: (-item[1], item[0])))
 
     output = {
         "high": {"message": "\nIPs with high activity:", "ips": []},
         "blocked": {"message": "\nIPs already blocked by current settings:", "ips": []},
     }
+    blocked_requests = 0
     for ip, count in sorted_ips.items():
         try:
             ip_obj = ip_address(ip)
@@ -103,18 +333,15 @@ def main():
             print(f"Invalid IP extracted from log: {ip}")
             continue
 
+        blocked = ip_obj in blocklist
+        if blocked:
+            blocked_requests += count
+
         # Ignore IPs below threshold
         if count < threshold:
             continue
 
         # Ignore IPs already blocked
-        blocked = False
-        if ip in BLOCKED_IPS:
-            blocked = True
-        for ip_range in BLOCKED_IP_RANGES:
-            if ip_obj in ip_range:
-                blocked = True
-
         type = "blocked" if blocked else "high"
         output[type]["ips"].append(f"  {ip}: {count}")
 
@@ -125,6 +352,22 @@ def main():
         else:
             print("  -")
 
+    if len(blocklist):
+        total_requests = sum(sorted_ips.values())
+        print(
+            f"\nRequests blocked by {len(blocklist)} BLOCKED_IPS entries: "
+            f"{blocked_requests} of {total_requests}"
+        )
+
+    # Only consider traffic not blocked yet
+    unblocked_ips = {
+        ip: count for ip, count in sorted_ips.items() if ip not in blocklist
+    }
+    if args.subnets:
+        print_subnets(unblocked_ips, threshold)
+    if args.suggest:
+        print_suggestions(unblocked_ips, threshold, args.max_collateral, blocklist)
+
 
 if __name__ == "__main__":
     main()
@@ -15,51 +15,104 @@ Alternative methods here: https://devcenter.heroku.com/articles/logging#view-log
 
 Usage:
     python check_paths_ip_heroku_log.py log.txt 192.168.0.1
+    python check_paths_ip_heroku_log.py --jobs 8 huge_log.txt --ip 192.168.0.1
+    python check_paths_ip_heroku_log.py log.txt --ip "1.2.3.4, 5.6.0.0/16"
+
+Paths are grouped by route template, e.g. /{locale}/{project}/{resource}/
+for all the resources of all the projects, so a scraper walking thousands of
+pages shows up as a handful of rows. Use --exact to count exact paths.
+
+--ip accepts several comma-separated IPs and ranges (CIDR notation), checked
+in a single pass; the number of distinct IPs is reported for each path.
+
+Compressed logs (.gz, .zst) and stdin (-) are supported. For large
+uncompressed logs, --jobs scans chunks of the file in parallel processes.
 """
 
-from os.path import isfile
 import argparse
 import re
-import sys
+
+from heroku_log import check_log_file, normalize_path, open_log, parallel_count
+from ip_blocklist import Blocklist
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "log_file",
-        help="Path to log file",
+        help="Path to log file, or - to read from stdin",
     )
     parser.add_argument(
         "--ip",
         required=True,
-        help="IP to check",
+        help="IP to check, or comma-separated list of IPs and ranges (CIDR)",
+    )
+    parser.add_argument(
+        "--exact",
+        required=False,
+        action="store_true",
+        help="Count exact paths instead of route templates",
+    )
+    parser.add_argument(
+        "--jobs",
+        required=False,
+        type=int,
+        default=1,
+        help="Number of processes scanning the log in parallel (0: all CPUs)",
     )
     args = parser.parse_args()
     log_file = args.log_file
 
-    if not isfile(log_file):
-        sys.exit(f"File {log_file} doesn't exist.")
+    check_log_file(log_file)
+
+    ips = Blocklist(args.ip)
+    for ip in ips.invalid:
+        parser.error(f"Invalid IP or IP range: {ip}")
+    # A single IP is compared as a string, without parsing addresses
+    single_ip = len(ips) == 1 and "/" not in args.ip
+    if single_ip:
+        ips = {args.ip.strip()}
+    transform = None if args.exact else normalize_path
 
     paths = {}
-    filter = re.compile(r"path=\"([^\"]*)\".*fwd=\"([\d.]+)\"")
-
-    with open(log_file) as f:
-        content = f.readlines()
-        for line in content:
-            match = filter.search(line)
-            if match:
-                path = match.group(1)
-                ip = match.group(2)
-                if ip == args.ip:
-                    if path not in paths:
-                        paths[path] = 1
-                    else:
-                        paths[path] += 1
-
-    sorted_paths = dict(sorted(paths.items(), key=lambda item: item[1], reverse=True))
+    path_ips = {}
+    filter = re.compile(r"path=\"([^\"]*)\".*fwd=\"([\da-fA-F.:]+)")
+
+    if args.jobs != 1:
+        paths, path_ips = parallel_count(
+            log_file,
+            rb"path=\"([^\"\n]*)\".*fwd=\"([\da-fA-F.:]+)",
+            filter_group=2,
+            filter_value=args.ip.strip() if single_ip else ips,
+            jobs=args.jobs,
+            transform=transform,
+            distinct_group=2,
+        )
+    else:
+        with open_log(log_file) as f:
+            for line in f:
+                match = filter.search(line)
+                if match:
+                    path = match.group(1)
+                    ip = match.group(2)
+                    if ip in ips:
+                        if transform:
+                            path = transform(path)
+                        if path not in paths:
+                            paths[path] = 1
+                            path_ips[path] = {ip}
+                        else:
+                            paths[path] += 1
+                            path_ips[path].add(ip)
+
+    # Ties sorted by path, so that the output is the same with --jobs
+    sorted_paths = dict(sorted(paths.items(), key=lambda item: (-item[1], item[0])))
 
     for path, count in sorted_paths.items():
-        print(f"Path ({count}): {path}")
+        if single_ip:
+            print(f"Path ({count}): {path}")
+        else:
+            print(f"Path ({count}, {len(path_ips[path])} IPs): {path}")
 
 
 if __name__ == "__main__":
@@ -4,31 +4,324 @@ Author: phlax
 Usage:
 with debug_sql():
     code_with_some_db_action()
+
+Queries to all the databases are captured with execute wrappers, so this
+works without DEBUG=True (e.g. on production shells), and only the last
+`max_queries` are kept in memory for the log.
+
+Queries are logged with their time, followed by a summary grouping them by
+fingerprint (the statement with literals replaced by ?), with count, total
+and mean time. Fingerprints executed at least `n_plus_one` times from the
+same line of code are reported as possible N+1 queries, with that line.
+
+The report is also available as the value of the context manager:
+with debug_sql(n_plus_one=20) as report:
+    code_with_some_db_action()
+report.n_plus_one  # [(fingerprint, call site, count, total time in s), ...]
+
+With explain_slow (in ms), read queries slower than that on PostgreSQL are
+run again, once per fingerprint, with EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)
+in a transaction rolled back afterwards. The report then lists their plan
+summary: sequential scans, row estimates off by 10x or more, and sorts or
+hashes spilling to disk.
+with debug_sql(explain_slow=500) as report:
+    code_with_some_db_action()
+report.plans  # {fingerprint: (alias, sql, time in s, plan summary), ...}
 """
 
+import json
+import linecache
 import logging
-from contextlib import contextmanager
-from django.db import connection
+import os
+import re
+import sys
+from collections import defaultdict, deque
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache, partial
+from time import perf_counter_ns
+from django.db import DatabaseError, connections, transaction
 
 
 log = logging.getLogger(__name__)
 
+# Number of queries kept for the log, oldest dropped first (totals and
+# fingerprints include all queries)
+MAX_QUERIES = 10000
+
+# (pattern, replacement) applied in order to compute fingerprints
+FINGERPRINT_RULES = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    # Lists of values, e.g. IN (?, ?, ?)
+    (
+        re.compile(r"\b(IN|VALUES)\s*\((?:\s*\?\s*,)*\s*\?\s*\)", re.IGNORECASE),
+        r"\1 (?)",
+    ),
+    (re.compile(r"\s+"), " "),
+]
+
+EXPLAIN = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)"
+# Only read queries are explained
+EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+# Plan nodes whose estimated rows are off by this factor are reported
+ESTIMATE_ERROR = 10
+
+# Frames from these folders are skipped to find the code issuing a query
+IGNORED_PATHS = (
+    os.path.dirname(os.path.dirname(os.path.abspath(logging.__file__))),
+    os.path.abspath(__file__),
+)
+# Frames walked at most to find it
+MAX_STACK_DEPTH = 100
+
+
+# Django issues the same parameterized statements over and over
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """Return sql with literals and placeholders replaced by ?."""
+    for pattern, replacement in FINGERPRINT_RULES:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def summarize_plan(plan):
+    """
+    Summarize a PostgreSQL JSON plan: execution time, buffers, sequential
+    scans, nodes with bad row estimates, and sorts or hashes spilling to disk.
+    """
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]["Plan"]
+    summary = {
+        "execution_time": plan[0].get("Execution Time"),
+        "shared_hit_blocks": root.get("Shared Hit Blocks", 0),
+        "shared_read_blocks": root.get("Shared Read Blocks", 0),
+        "seq_scans": [],
+        "estimate_errors": [],
+        "spills": [],
+    }
+
+    for node in plan_nodes(root):
+        node_type = node["Node Type"]
+        relation = node.get("Relation Name", "")
+        # Row counts are per loop
+        estimated = node.get("Plan Rows", 0)
+        actual = node.get("Actual Rows", 0)
+        loops = node.get("Actual Loops", 1)
+
+        if node_type == "Seq Scan":
+            summary["seq_scans"].append((relation, actual * loops))
+        low, high = sorted([estimated, actual])
+        # Nodes never executed have no actual rows
+        if loops and high >= ESTIMATE_ERROR * max(low, 1):
+            summary["estimate_errors"].append(
+                (f"{node_type} {relation}".strip(), estimated, actual)
+            )
+        if node.get("Sort Space Type") == "Disk":
+            summary["spills"].append(
+                (f"Sort ({node.get('Sort Method')})", node.get("Sort Space Used"))
+            )
+        if node.get("Hash Batches", 1) > 1:
+            batches = node["Hash Batches"]
+            summary["spills"].append(
+                (f"Hash ({batches} batches)", node.get("Peak Memory Usage"))
+            )
+
+    return summary
+
+
+def format_plan_summary(summary):
+    if "error" in summary:
+        return [f"EXPLAIN failed: {summary['error']}"]
+
+    lines = [
+        f"execution {summary['execution_time']:.3f}ms, buffers: "
+        f"{summary['shared_hit_blocks']} hit, {summary['shared_read_blocks']} read"
+    ]
+    for relation, rows in summary["seq_scans"]:
+        lines.append(f"seq scan on {relation} ({rows} rows)")
+    for node, estimated, actual in summary["estimate_errors"]:
+        lines.append(
+            f"bad estimate: {node}, {estimated} rows estimated, {actual} actual"
+        )
+    for node, size in summary["spills"]:
+        lines.append(f"spilled to disk: {node}, {size}kB")
+    return lines
+
 
-def log_new_queries(queries):
-    new_queries = list(connection.queries[queries:])
+@lru_cache(maxsize=None)
+def _ignored(code):
+    filename = code.co_filename
+    return filename.startswith(IGNORED_PATHS) or "/django/" in filename
 
-    for query in new_queries:
-        log.debug(query["time"])
-        log.debug("\t%s", query["sql"])
 
-    log.debug("total db calls: %s", len(new_queries))
+def call_site():
+    """Return (filename, line number, function) of the code issuing a query."""
+    frame = sys._getframe(1)
+    for _ in range(MAX_STACK_DEPTH):
+        if frame is None:
+            break
+        code = frame.f_code
+        if not _ignored(code):
+            return code.co_filename, frame.f_lineno, code.co_name
+        frame = frame.f_back
+    return "?", 0, "?"
+
+
+class QueryReport:
+    def __init__(self, n_plus_one=10, max_queries=MAX_QUERIES, explain_slow=None):
+        self.n_plus_one_threshold = n_plus_one
+        self.explain_slow = explain_slow
+        self.explaining = False
+        # Fingerprint: (alias, sql, time in s, plan summary) for slow queries
+        self.plans = {}
+        # Most recent queries: (alias, sql, params, time in ns, call site)
+        self.queries = deque(maxlen=max_queries)
+        self.count = 0
+        # Rows returned or affected, as reported by the database cursors
+        self.rows = 0
+        self.time = 0
+        # Totals for all the queries, by fingerprint and by call site:
+        # key: [count, time in ns]
+        self.groups = defaultdict(lambda: [0, 0])
+        self.sites = defaultdict(lambda: [0, 0])
+        self.fingerprints = []
+        self.n_plus_one = []
+
+    def execute_wrapper(self, alias):
+        return partial(self.record, alias)
+
+    def record(self, alias, execute, sql, params, many, context):
+        # Queries run to explain slow queries aren't recorded
+        if self.explaining:
+            return execute(sql, params, many, context)
+
+        site = call_site()
+        start = perf_counter_ns()
+        try:
+            result = execute(sql, params, many, context)
+        finally:
+            time = perf_counter_ns() - start
+            self.queries.append((alias, sql, params, time, site))
+            self.count += 1
+            self.time += time
+            self.rows += max(getattr(context.get("cursor"), "rowcount", 0) or 0, 0)
+
+            key = fingerprint(sql)
+            for totals in [self.groups[key], self.sites[(key, site)]]:
+                totals[0] += 1
+                totals[1] += time
+
+        if self.explain_slow is not None and time >= self.explain_slow * 1e6:
+            if not many and key not in self.plans:
+                self.explain(alias, sql, params, key, time)
+        return result
+
+    def explain(self, alias, sql, params, key, time):
+        """
+        Run sql again with EXPLAIN ANALYZE, in a transaction (or savepoint)
+        rolled back afterwards, and store the summary of its plan.
+        """
+        db = connections[alias]
+        if db.vendor != "postgresql" or not EXPLAINABLE.match(sql):
+            return
+
+        self.explaining = True
+        try:
+            with transaction.atomic(using=alias):
+                with db.cursor() as cursor:
+                    cursor.execute(f"{EXPLAIN} {sql}", params)
+                    plan = cursor.fetchone()[0]
+                transaction.set_rollback(True, using=alias)
+            summary = summarize_plan(plan)
+        except DatabaseError as e:
+            summary = {"error": str(e).strip()}
+        finally:
+            self.explaining = False
+
+        self.plans[key] = (alias, sql, time / 1e9, summary)
+
+    def analyze(self):
+        """Sort fingerprints by total time, and find possible N+1 queries."""
+        self.fingerprints = sorted(
+            (
+                (sql, count, time / 1e9, time / count / 1e9)
+                for sql, (count, time) in self.groups.items()
+            ),
+            key=lambda item: item[2],
+            reverse=True,
+        )
+        self.n_plus_one = sorted(
+            (
+                (sql, site, count, time / 1e9)
+                for (sql, site), (count, time) in self.sites.items()
+                if count >= self.n_plus_one_threshold
+            ),
+            key=lambda item: item[2],
+            reverse=True,
+        )
+
+
+def log_new_queries(report):
+    for alias, sql, params, time, _ in report.queries:
+        log.debug("%.3fms (%s)", time / 1e6, alias)
+        log.debug("\t%s\t%r", sql, params)
+
+    log.debug(
+        "total db calls: %s (%.3fms, %s rows)",
+        report.count,
+        report.time / 1e6,
+        report.rows,
+    )
+    if report.count > len(report.queries):
+        log.debug("only the last %s queries are listed", len(report.queries))
+
+    report.analyze()
+
+    log.debug("queries by fingerprint (count, total time, mean time):")
+    for sql, count, total, mean in report.fingerprints:
+        log.debug("%5d %11.3fms %9.3fms\t%s", count, total * 1e3, mean * 1e3, sql)
+
+    for sql, (filename, line, function), count, total in report.n_plus_one:
+        log.debug(
+            "possible N+1: %s queries (%.3fms) from %s:%s in %s\n\t%s\n\t%s",
+            count,
+            total * 1e3,
+            filename,
+            line,
+            function,
+            linecache.getline(filename, line).strip(),
+            sql,
+        )
+
+    for alias, sql, time, summary in report.plans.values():
+        log.debug("slow query (%.3fms, %s):\n\t%s", time * 1e3, alias, sql)
+        for line in format_plan_summary(summary):
+            log.debug("\t%s", line)
+
+
+@contextmanager
+def capture_queries(report):
+    """Record queries to all the databases in report."""
+    with ExitStack() as stack:
+        for db in connections.all():
+            stack.enter_context(db.execute_wrapper(report.execute_wrapper(db.alias)))
+        yield report
 
 
 @contextmanager
-def debug_sql():
-    queries = len(connection.queries)
+def debug_sql(n_plus_one=10, max_queries=MAX_QUERIES, explain_slow=None):
+    report = QueryReport(n_plus_one, max_queries, explain_slow)
 
     try:
-        yield
+        with capture_queries(report):
+            yield report
     finally:
-        log_new_queries(queries)
+        log_new_queries(report)
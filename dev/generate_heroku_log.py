@@ -0,0 +1,250 @@
+"""
+Generate synthetic Heroku router logs, to test and benchmark the log analysis
+scripts without production data.
+
+Clients follow a Zipf distribution: a few bots (clustered in a handful of
+subnets) generate most of the traffic, followed by a long tail of IPs with a
+handful of requests each. Paths are drawn from a mix of Pontoon routes, and
+about 10% of the lines are app logs, ignored by the router parsers.
+
+Usage:
+    python generate_heroku_log.py --lines 1000000 > log.txt
+    python generate_heroku_log.py --lines 10000000 --ipv6 0.3 --output log.txt.gz
+    python generate_heroku_log.py --path-mix translate=1,static=5 > log.txt
+"""
+
+from datetime import datetime, timedelta
+from itertools import accumulate
+import argparse
+import gzip
+import random
+import sys
+
+LOCALES = ["de", "fr", "it", "es-ES", "ja", "pt-BR", "zh-TW", "sr-Latn", "sl"]
+PROJECTS = ["firefox", "firefox-for-android", "thunderbird", "mozilla-vpn-client"]
+RESOURCES = [
+    "browser/browser/browser.ftl",
+    "mobile/android/strings.xml",
+    "mail/messenger/messenger.ftl",
+    "translations/strings.xliff",
+]
+
+# Name: (weight, function returning a path, median service time in ms)
+PATHS = {
+    "translate": (
+        40,
+        lambda rng: f"/{rng.choice(LOCALES)}/{rng.choice(PROJECTS)}/"
+        f"{rng.choice(RESOURCES)}/?string={rng.randrange(200000)}",
+        120,
+    ),
+    "all-resources": (
+        15,
+        lambda rng: f"/{rng.choice(LOCALES)}/{rng.choice(PROJECTS)}"
+        f"/all-resources/?string={rng.randrange(200000)}",
+        250,
+    ),
+    "localization": (
+        10,
+        lambda rng: f"/{rng.choice(LOCALES)}/{rng.choice(PROJECTS)}/",
+        300,
+    ),
+    "team": (5, lambda rng: f"/{rng.choice(LOCALES)}/", 200),
+    "project": (5, lambda rng: f"/projects/{rng.choice(PROJECTS)}/", 180),
+    "api": (
+        10,
+        lambda rng: f"/graphql?query={{project(slug:%22{rng.choice(PROJECTS)}%22)}}",
+        90,
+    ),
+    "static": (15, lambda rng: f"/static/css/{rng.randrange(50)}.css", 2),
+}
+
+STATUSES = [200] * 90 + [302] * 4 + [404] * 3 + [403, 500, 503]
+
+
+def make_ips(count, bots=20, bot_subnets=4, ipv6=0.1, seed=0):
+    """
+    Return count distinct client IPs, from most to least active: bots come
+    first, and share bot_subnets /24 (IPv4) or /64 (IPv6) networks.
+    """
+    rng = random.Random(seed)
+    subnets = [
+        (f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.", 4)
+        if rng.random() >= ipv6
+        else (f"2001:db8:{rng.randrange(65536):x}:{rng.randrange(65536):x}::", 6)
+        for _ in range(bot_subnets)
+    ]
+
+    ips = []
+    seen = set()
+    while len(ips) < count:
+        if len(ips) < bots:
+            prefix, version = rng.choice(subnets)
+            ip = prefix + (
+                str(rng.randrange(1, 255))
+                if version == 4
+                else f"{rng.randrange(1, 65536):x}"
+            )
+        elif rng.random() < ipv6:
+            ip = ":".join(f"{rng.randrange(65536):x}" for _ in range(8))
+        else:
+            ip = ".".join(str(rng.randrange(1, 255)) for _ in range(4))
+        if ip not in seen:
+            seen.add(ip)
+            ips.append(ip)
+
+    return ips
+
+
+def parse_path_mix(value):
+    """Parse name=weight,... into a PATHS-like dict with the given weights."""
+    paths = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in PATHS:
+            raise argparse.ArgumentTypeError(
+                f"Unknown path type {name}, use: {', '.join(PATHS)}"
+            )
+        _, function, service = PATHS[name.strip()]
+        paths[name.strip()] = (float(weight or 1), function, service)
+
+    return paths
+
+
+def generate(
+    f,
+    lines,
+    ips,
+    zipf=1.1,
+    paths=PATHS,
+    rate=1000,
+    start=datetime(2024, 1, 1),
+    seed=0,
+):
+    """
+    Write lines log lines to f: router requests from ips, following a Zipf
+    distribution of exponent zipf, at `rate` requests per second from start
+    (UTC).
+    """
+    rng = random.Random(seed)
+    ip_weights = list(accumulate(1 / rank**zipf for rank in range(1, len(ips) + 1)))
+    path_types = list(paths.values())
+    path_weights = list(accumulate(weight for weight, _, _ in path_types))
+
+    batch_size = 10000
+    current_second = None
+    for batch_start in range(0, lines, batch_size):
+        batch = min(batch_size, lines - batch_start)
+        batch_ips = rng.choices(ips, cum_weights=ip_weights, k=batch)
+        batch_paths = rng.choices(path_types, cum_weights=path_weights, k=batch)
+
+        output = []
+        for i in range(batch):
+            # Only format the date once per second
+            offset = (batch_start + i) * 1000000 // rate
+            second, microseconds = divmod(offset, 1000000)
+            if second != current_second:
+                current_second = second
+                date = start + timedelta(seconds=second)
+                date = date.strftime("%Y-%m-%dT%H:%M:%S")
+            timestamp = f"{date}.{microseconds:06d}+00:00"
+            dyno = f"web.{rng.randrange(1, 5)}"
+            if rng.random() < 0.1:
+                output.append(
+                    f"{timestamp} app[{dyno}]: INFO Request handled "
+                    f"pid={rng.randrange(1000, 9999)}\n"
+                )
+                continue
+
+            _, path, service = batch_paths[i]
+            output.append(
+                f"{timestamp} heroku[router]: at=info method=GET "
+                f'path="{path(rng)}" host=pontoon.mozilla.org '
+                f"request_id={rng.getrandbits(64):016x} "
+                f'fwd="{batch_ips[i]}" dyno={dyno} connect={rng.randrange(3)}ms '
+                f"service={int(rng.lognormvariate(0, 0.8) * service)}ms "
+                f"status={rng.choice(STATUSES)} bytes={rng.randrange(200, 50000)} "
+                "protocol=https\n"
+            )
+        f.write("".join(output))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--lines",
+        type=int,
+        default=1000000,
+        help="Number of log lines to generate",
+    )
+    parser.add_argument(
+        "--ips",
+        type=int,
+        default=100000,
+        help="Number of distinct client IPs",
+    )
+    parser.add_argument(
+        "--bots",
+        type=int,
+        default=20,
+        help="Number of most active IPs, sharing a few subnets",
+    )
+    parser.add_argument(
+        "--zipf",
+        type=float,
+        default=1.1,
+        help="Exponent of the Zipf distribution of requests per IP",
+    )
+    parser.add_argument(
+        "--ipv6",
+        type=float,
+        default=0.1,
+        help="Fraction of IPv6 clients",
+    )
+    parser.add_argument(
+        "--path-mix",
+        type=parse_path_mix,
+        default=PATHS,
+        help="Weights of path types, e.g. translate=40,static=15 "
+        f"({', '.join(PATHS)})",
+    )
+    parser.add_argument(
+        "--rate",
+        type=int,
+        default=1000,
+        help="Requests per second, to compute timestamps",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Random seed, the same seed generates the same log",
+    )
+    parser.add_argument(
+        "--output",
+        required=False,
+        help="Output file (.gz is compressed, default: stdout)",
+    )
+    args = parser.parse_args()
+
+    ips = make_ips(args.ips, args.bots, ipv6=args.ipv6, seed=args.seed)
+    if args.output is None:
+        f = sys.stdout
+    elif args.output.endswith(".gz"):
+        f = gzip.open(args.output, "wt", compresslevel=1)
+    else:
+        f = open(args.output, "w")
+
+    with f:
+        generate(
+            f,
+            args.lines,
+            ips,
+            zipf=args.zipf,
+            paths=args.path_mix,
+            rate=args.rate,
+            seed=args.seed,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Bounded-memory heavy hitter detection over a sliding time window.
+
+SpaceSaving keeps approximate counts for at most `capacity` keys: every key
+occurring more than 1/capacity of the time is guaranteed to be tracked, and
+its count is overestimated by at most `error`.
+
+SlidingWindow splits the window in buckets, each with its own SpaceSaving
+sketch, and drops expired buckets as time advances: memory stays constant
+however long it runs and however many distinct keys appear.
+"""
+
+from collections import deque
+import heapq
+
+
+class SpaceSaving:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        # key: [count, error]
+        self.counters = {}
+        # (count, key) for each key, counts possibly outdated: they only grow,
+        # so the smallest up-to-date entry is the key with the smallest count
+        self.heap = []
+
+    def add(self, key, count=1):
+        """Count key, and return the key evicted to make room for it (if any)."""
+        counter = self.counters.get(key)
+        if counter is not None:
+            counter[0] += count
+            return None
+
+        if len(self.counters) < self.capacity:
+            self.counters[key] = [count, 0]
+            heapq.heappush(self.heap, (count, key))
+            return None
+
+        # Replace the key with the smallest count, which becomes the
+        # maximum overestimation of the new key's count.
+        while True:
+            min_count, min_key = self.heap[0]
+            current_count = self.counters[min_key][0]
+            if current_count == min_count:
+                break
+            heapq.heapreplace(self.heap, (current_count, min_key))
+        del self.counters[min_key]
+        self.counters[key] = [min_count + count, min_count]
+        heapq.heapreplace(self.heap, (min_count + count, key))
+        return min_key
+
+    def lower_bound(self, key):
+        """Guaranteed minimum count of key."""
+        counter = self.counters.get(key)
+        return counter[0] - counter[1] if counter else 0
+
+    def upper_bound(self, key):
+        """Guaranteed maximum count of key."""
+        counter = self.counters.get(key)
+        if counter:
+            return counter[0]
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(counter[0] for counter in self.counters.values())
+
+
+class SlidingWindow:
+    def __init__(self, window, buckets=12, capacity=1000):
+        self.bucket_size = window / buckets
+        self.buckets = deque(maxlen=buckets)
+        self.capacity = capacity
+        self.current = None
+
+    def advance(self, timestamp):
+        """Move the window to timestamp (in seconds), dropping expired buckets."""
+        bucket = int(timestamp // self.bucket_size)
+        if self.current is None or bucket > self.current:
+            # Add empty buckets for the time elapsed, at most a full window
+            missing = min(bucket - (self.current or bucket - 1), self.buckets.maxlen)
+            for _ in range(missing):
+                self.buckets.append(SpaceSaving(self.capacity))
+            self.current = bucket
+
+    def add(self, key, timestamp, count=1):
+        self.advance(timestamp)
+        self.buckets[-1].add(key, count)
+
+    def count(self, key):
+        """Guaranteed minimum count of key over the window."""
+        return sum(bucket.lower_bound(key) for bucket in self.buckets)
+
+    def top(self, n):
+        """Keys with the highest minimum count over the window."""
+        keys = set()
+        for bucket in self.buckets:
+            keys.update(bucket.counters)
+        counts = [(key, self.count(key)) for key in keys]
+        counts.sort(key=lambda item: item[1], reverse=True)
+
+        return counts[:n]
@@ -0,0 +1,331 @@
+"""
+Helpers shared by the scripts analyzing Heroku router logs.
+
+open_log() reads logs lazily, line by line, from:
+* plain text files
+* gzip (.gz) or zstd (.zst, requires `pip install zstandard`) compressed files
+* stdin, using `-` as file name, e.g.
+  heroku logs --tail --app mozilla-pontoon | python check_ips_heroku_log.py -
+
+parallel_count() scans large uncompressed logs with a pool of processes:
+the file is memory-mapped and split into newline-aligned chunks, matched as
+raw bytes without decoding, and per-chunk counts (and optionally distinct
+values, e.g. IPs per path) are merged.
+
+parse_router_line() parses a router log line into a RouterRecord, and
+normalize_path() maps a path to its route template (locale code, project
+slug, resource, numeric ids and query parameter values collapsed).
+"""
+
+from collections import Counter, defaultdict, namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+from multiprocessing import Pool
+from os.path import getsize, isfile
+import gzip
+import io
+import mmap
+import os
+import re
+import sys
+import time
+
+# Size of the chunks processed by each worker in parallel_count()
+CHUNK_SIZE = 64 * 1024 * 1024
+
+RouterRecord = namedtuple(
+    "RouterRecord",
+    [
+        "timestamp",
+        "ip",
+        "method",
+        "path",
+        "status",
+        "connect",
+        "service",
+        "bytes",
+        "dyno",
+    ],
+)
+
+ROUTER_FIELDS = re.compile(r'(\w+)=(?:"([^"]*)"|(\S*))')
+NUMERIC_SEGMENT = re.compile(r"(?<=/)\d+(?=/|$)")
+
+# Top level Pontoon URLs, not to be mistaken for locale codes
+TOP_LEVEL_PAGES = (
+    "a|accounts|admin|ajax|api|contributors|graphql|insights|messaging|"
+    "notifications|projects|search|settings|static|teams|terminology|translate"
+)
+# Pages of a team (/{locale}/...) or localization (/{locale}/{project}/...)
+TEAM_PAGES = "ajax|bugs|contributors|info|insights|localizations|tags"
+# Vulnerability scanner targets, grouped as a single route
+PROBE_PAGES = r"\.env|\.git|cgi-bin|phpmyadmin|vendor|wordpress|wp|wp-[^/]*|[^/]*\.php"
+# Language, then script (Latn), region (GB, 419) or variant subtags, as used by
+# Pontoon locale codes (e.g. sr-Latn, es-419, ca-valencia, ja-JP-mac)
+LOCALE = (
+    rf"(?!(?:{TOP_LEVEL_PAGES})(?:/|$))[a-z]{{2,3}}"
+    r"(?:-(?:[A-Z][a-z]{3}|[A-Z]{2}|\d{3}|valencia|mac))*"
+)
+
+# (rule, template) applied by normalize_path(), first matching rule wins
+PATH_RULES = [
+    (re.compile(rule), template)
+    for rule, template in [
+        (r"^/static/.+", "/static/{file}"),
+        (rf"^/(?:{PROBE_PAGES})(/.*)?$", "/{probe}"),
+        (r"^/projects/[^/]+(/.*)?$", r"/projects/{project}\1"),
+        (r"^/contributors/[^/]+(/.*)?$", r"/contributors/{user}\1"),
+        (rf"^/{LOCALE}/({TEAM_PAGES})(/.*)?$", r"/{locale}/\1\2"),
+        (
+            rf"^/{LOCALE}/[^/]+/({TEAM_PAGES}|all-resources)(/.*)?$",
+            r"/{locale}/{project}/\1\2",
+        ),
+        (rf"^/{LOCALE}/[^/]+/.+$", "/{locale}/{project}/{resource}/"),
+        (rf"^/{LOCALE}/[^/]+/?$", "/{locale}/{project}/"),
+        (rf"^/{LOCALE}/?$", "/{locale}/"),
+    ]
+]
+
+
+def check_log_file(log_file):
+    if log_file != "-" and not isfile(log_file):
+        sys.exit(f"File {log_file} doesn't exist.")
+
+
+@contextmanager
+def open_log(log_file):
+    """Open a log file (or stdin with `-`) for reading as text."""
+    if log_file == "-":
+        yield io.TextIOWrapper(sys.stdin.buffer, errors="replace")
+        return
+
+    if log_file.endswith(".gz"):
+        f = gzip.open(log_file, "rt", errors="replace")
+    elif log_file.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            sys.exit("Reading .zst files requires zstandard: pip install zstandard")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(log_file, "rb"))
+        f = io.TextIOWrapper(reader, errors="replace")
+    else:
+        f = open(log_file, errors="replace")
+
+    with f:
+        yield f
+
+
+def follow_log(f, poll_interval=0.5):
+    """
+    Iterate over lines of an open log, like `tail -f`: for files, wait for
+    new lines at the end instead of stopping. Stdin stops when closed.
+    """
+    while True:
+        line = f.readline()
+        if line:
+            yield line
+        elif f.isatty() or not f.seekable():
+            # Pipe closed
+            return
+        else:
+            time.sleep(poll_interval)
+
+
+def parse_timestamp(timestamp):
+    """Return a log timestamp as seconds since the epoch, None if invalid."""
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except ValueError:
+        return None
+
+
+def _to_int(value):
+    """Convert values like `12`, `12ms` to int, None if invalid."""
+    try:
+        return int(value.rstrip("ms"))
+    except ValueError:
+        return None
+
+
+def parse_router_line(line):
+    """
+    Parse a Heroku router log line, e.g.
+
+    2024-01-01T00:00:00.000000+00:00 heroku[router]: at=info method=GET
+    path="/" host=pontoon.mozilla.org request_id=... fwd="1.2.3.4"
+    dyno=web.1 connect=0ms service=12ms status=200 bytes=1234 protocol=https
+
+    Return a RouterRecord (times in ms), or None for other lines.
+    """
+    if "heroku[router]" not in line:
+        return None
+
+    fields = {
+        key: quoted or plain
+        for key, quoted, plain in ROUTER_FIELDS.findall(line)
+    }
+    if "fwd" not in fields:
+        return None
+
+    return RouterRecord(
+        timestamp=line.split(" ", 1)[0],
+        # fwd may contain a list of proxies: the first one is the client
+        ip=fields["fwd"].split(",")[0].strip(),
+        method=fields.get("method", ""),
+        path=fields.get("path", ""),
+        status=_to_int(fields.get("status", "")),
+        connect=_to_int(fields.get("connect", "")),
+        service=_to_int(fields.get("service", "")),
+        bytes=_to_int(fields.get("bytes", "")),
+        dyno=fields.get("dyno", ""),
+    )
+
+
+@lru_cache(maxsize=65536)
+def _route_template(path):
+    for rule, template in PATH_RULES:
+        if rule.match(path):
+            path = rule.sub(template, path, count=1)
+            break
+
+    return NUMERIC_SEGMENT.sub("{id}", path)
+
+
+def normalize_path(path):
+    """
+    Map a requested path to its route template, e.g.
+    /it/firefox/browser/chrome/browser.ftl?string=123&search=tab
+    becomes /{locale}/{project}/{resource}/?search=*&string=*
+    """
+    path, _, query = path.partition("?")
+    path = _route_template(path)
+    if query:
+        names = {param.partition("=")[0] for param in query.split("&") if param}
+        path += "?" + "&".join(f"{name}=*" for name in sorted(names))
+
+    return path
+
+
+def chunk_boundaries(log_file, chunk_size=CHUNK_SIZE):
+    """Split a file in (start, end) ranges of about chunk_size, ending on newlines."""
+    size = getsize(log_file)
+    boundaries = []
+    with open(log_file, "rb") as f:
+        start = 0
+        while start < size:
+            f.seek(min(start + chunk_size, size))
+            f.readline()
+            end = min(f.tell(), size)
+            boundaries.append((start, end))
+            start = end
+
+    return boundaries
+
+
+def _decode(value):
+    return value.decode("utf-8", errors="replace")
+
+
+def _count_chunk(args):
+    (
+        log_file,
+        start,
+        end,
+        pattern,
+        group,
+        filter_group,
+        filter_value,
+        transform,
+        distinct_group,
+    ) = args
+    counts = Counter()
+    distinct = defaultdict(set)
+    regex = re.compile(pattern)
+
+    with open(log_file, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for match in regex.finditer(mm, start, end):
+                if filter_group:
+                    value = match.group(filter_group)
+                    if isinstance(filter_value, bytes):
+                        if value != filter_value:
+                            continue
+                    elif _decode(value) not in filter_value:
+                        continue
+                key = match.group(group)
+                if transform:
+                    key = transform(_decode(key))
+                counts[key] += 1
+                if distinct_group:
+                    distinct[key].add(match.group(distinct_group))
+
+    return counts, dict(distinct)
+
+
+def parallel_count(
+    log_file,
+    pattern,
+    group=1,
+    filter_group=None,
+    filter_value=None,
+    jobs=None,
+    transform=None,
+    distinct_group=None,
+):
+    """
+    Count values of `group` for each match of the bytes regex `pattern` in
+    log_file, using `jobs` processes (default: number of CPUs). With
+    filter_group, only matches where that group equals filter_value count;
+    filter_value can also be a container of str values (e.g. a Blocklist).
+    With transform, a module-level function, values are counted as
+    transform(value), e.g. normalize_path.
+
+    The pattern is matched against the whole chunk, so it must not match
+    across lines (e.g. use [^"\\n]* instead of [^"]*).
+
+    Return a Counter with decoded (str) keys. With distinct_group, return
+    (Counter, dict) instead: the dict maps each key to the set of distinct
+    values of that group (e.g. the IPs requesting each path).
+    """
+    if log_file == "-" or log_file.endswith((".gz", ".zst")):
+        sys.exit("Parallel scanning is only available for uncompressed files.")
+    if getsize(log_file) == 0:
+        return Counter() if distinct_group is None else (Counter(), {})
+
+    if isinstance(filter_value, str):
+        filter_value = filter_value.encode("utf-8")
+    tasks = [
+        (
+            log_file,
+            start,
+            end,
+            pattern,
+            group,
+            filter_group,
+            filter_value,
+            transform,
+            distinct_group,
+        )
+        for start, end in chunk_boundaries(log_file)
+    ]
+
+    counts = Counter()
+    distinct = defaultdict(set)
+    with Pool(jobs or os.cpu_count()) as pool:
+        for chunk_counts, chunk_distinct in pool.imap_unordered(_count_chunk, tasks):
+            counts.update(chunk_counts)
+            for key, values in chunk_distinct.items():
+                distinct[key].update(values)
+
+    def decode_key(key):
+        return _decode(key) if isinstance(key, bytes) else key
+
+    counts = Counter({decode_key(key): count for key, count in counts.items()})
+    if distinct_group is None:
+        return counts
+
+    return counts, {
+        decode_key(key): {_decode(value) for value in values}
+        for key, values in distinct.items()
+    }
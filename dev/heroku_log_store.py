@@ -0,0 +1,297 @@
+"""
+Store Heroku router logs in a local SQLite database, to query captures from
+successive incidents without scanning the raw logs again.
+
+Each log file is parsed once: router requests are stored in one table per day
+(partitioned by timestamp), indexed on ip, route template (see
+heroku_log.normalize_path) and status, and exposed through the `requests`
+view. Files are identified by the hash of their content, so ingesting a file
+already imported (even renamed) does nothing.
+
+Columns of `requests`: timestamp, ip, method, path, template, status,
+connect, service (ms), bytes, dyno, file (hash of the source file).
+
+Usage:
+    # Import captures
+    python heroku_log_store.py ingest log-2024-01-01.txt log-2024-01-08.txt.gz
+
+    # List imported files and days
+    python heroku_log_store.py info
+
+    # Run a query (tables for days outside --since/--until are skipped)
+    python heroku_log_store.py query "SELECT ip, count(*) AS requests FROM requests
+        GROUP BY ip ORDER BY requests DESC LIMIT 10"
+    python heroku_log_store.py query --since 2024-01-08 "SELECT template,
+        avg(service) FROM requests WHERE status >= 500 GROUP BY template"
+"""
+
+from datetime import datetime
+from hashlib import sha256
+import argparse
+import csv
+import os
+import re
+import sqlite3
+import sys
+
+from heroku_log import check_log_file, normalize_path, open_log, parse_router_line
+
+# Rows inserted at once while ingesting
+BATCH_SIZE = 10000
+
+COLUMNS = [
+    "timestamp",
+    "ip",
+    "method",
+    "path",
+    "template",
+    "status",
+    "connect",
+    "service",
+    "bytes",
+    "dyno",
+    "file",
+]
+INDEXED_COLUMNS = ["ip", "template", "status"]
+PARTITION_NAME = re.compile(r"^requests_(\d{4})_(\d{2})_(\d{2})$")
+# Tables per UNION ALL in the requests view, below SQLite's limit of 500
+# terms in a compound SELECT (SQLITE_MAX_COMPOUND_SELECT)
+VIEW_CHUNK_SIZE = 250
+DAY = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def connect(database):
+    # Transactions are managed explicitly: in its default mode, the sqlite3
+    # module commits before CREATE TABLE statements
+    db = sqlite3.connect(database, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS files (
+            hash TEXT PRIMARY KEY,
+            name TEXT,
+            requests INTEGER,
+            ingested TEXT
+        )
+        """
+    )
+    return db
+
+
+def partitions(db, since=None, until=None):
+    """Return names of the per-day tables, only for days within since/until."""
+    tables = db.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name"
+    )
+    names = []
+    for (name,) in tables:
+        match = PARTITION_NAME.match(name)
+        if not match:
+            continue
+        day = "-".join(match.groups())
+        if (since and day < since[:10]) or (until and day > until[:10]):
+            continue
+        names.append(name)
+
+    return names
+
+
+def create_view(db, tables, temporary=False):
+    """Create the requests view over tables (temporary: for this connection)."""
+    db.execute(f"DROP VIEW IF EXISTS {'temp.' if temporary else ''}requests")
+    if tables:
+        # Union of unions, each with at most VIEW_CHUNK_SIZE tables
+        chunks = [
+            " UNION ALL ".join(f"SELECT * FROM {table}" for table in chunk)
+            for chunk in (
+                tables[i : i + VIEW_CHUNK_SIZE]
+                for i in range(0, len(tables), VIEW_CHUNK_SIZE)
+            )
+        ]
+        if len(chunks) == 1:
+            select = chunks[0]
+        else:
+            select = " UNION ALL ".join(f"SELECT * FROM ({chunk})" for chunk in chunks)
+    else:
+        # Empty view with the right columns
+        select = "SELECT " + ", ".join(f"NULL AS {c}" for c in COLUMNS) + " LIMIT 0"
+    db.execute(f"CREATE {'TEMP ' if temporary else ''}VIEW requests AS {select}")
+
+
+def file_hash(log_file):
+    """Hash of the content of the file (as stored, e.g. compressed)."""
+    digest = sha256()
+    with open(log_file, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def insert(db, rows_by_day, created):
+    for day, rows in rows_by_day.items():
+        table = f"requests_{day.replace('-', '_')}"
+        if table not in created:
+            db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "timestamp TEXT, ip TEXT, method TEXT, path TEXT, template TEXT, "
+                "status INTEGER, connect INTEGER, service INTEGER, bytes INTEGER, "
+                "dyno TEXT, file TEXT)"
+            )
+            created.add(table)
+        db.executemany(
+            f"INSERT INTO {table} VALUES ({', '.join('?' * len(COLUMNS))})", rows
+        )
+    rows_by_day.clear()
+
+
+def ingest_file(db, log_file):
+    """Import log_file, return the number of requests stored (None if known)."""
+    digest = file_hash(log_file)
+    if db.execute("SELECT 1 FROM files WHERE hash = ?", (digest,)).fetchone():
+        return None
+
+    requests = 0
+    rows_by_day = {}
+    created = set()
+    # A single transaction, tables included: an interrupted import leaves
+    # no trace
+    db.execute("BEGIN")
+    try:
+        with open_log(log_file) as f:
+            for line in f:
+                record = parse_router_line(line)
+                if record is None or not DAY.match(record.timestamp[:10]):
+                    continue
+                rows_by_day.setdefault(record.timestamp[:10], []).append(
+                    (
+                        record.timestamp,
+                        record.ip,
+                        record.method,
+                        record.path,
+                        normalize_path(record.path),
+                        record.status,
+                        record.connect,
+                        record.service,
+                        record.bytes,
+                        record.dyno,
+                        digest,
+                    )
+                )
+                requests += 1
+                if requests % BATCH_SIZE == 0:
+                    insert(db, rows_by_day, created)
+        insert(db, rows_by_day, created)
+
+        # Indexes are created after the first bulk insert in each table
+        for table in created:
+            for column in ["timestamp"] + INDEXED_COLUMNS:
+                db.execute(
+                    f"CREATE INDEX IF NOT EXISTS {table}_{column} ON {table} ({column})"
+                )
+        db.execute(
+            "INSERT INTO files VALUES (?, ?, ?, ?)",
+            (digest, os.path.basename(log_file), requests, datetime.now().isoformat()),
+        )
+        create_view(db, partitions(db))
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    db.execute("COMMIT")
+
+    return requests
+
+
+def ingest(args):
+    db = connect(args.db)
+    for log_file in args.log_files:
+        if log_file == "-":
+            sys.exit("Logs must be saved to a file before ingesting.")
+        check_log_file(log_file)
+        requests = ingest_file(db, log_file)
+        if requests is None:
+            print(f"{log_file}: already ingested, skipped")
+        else:
+            print(f"{log_file}: {requests} requests ingested")
+    db.execute("PRAGMA optimize")
+    db.close()
+
+
+def info(args):
+    db = connect(args.db)
+    print("Files:")
+    for name, requests, ingested in db.execute(
+        "SELECT name, requests, ingested FROM files ORDER BY ingested"
+    ):
+        print(f"  {name}: {requests} requests, ingested {ingested[:19]}")
+
+    print("Days:")
+    for table in partitions(db):
+        (requests,) = db.execute(f"SELECT count(*) FROM {table}").fetchone()
+        print(f"  {table[9:].replace('_', '-')}: {requests} requests")
+    db.close()
+
+
+def query(args):
+    if not os.path.isfile(args.db):
+        sys.exit(f"Database {args.db} doesn't exist, ingest logs first.")
+
+    db = connect(args.db)
+    # Shadow the requests view with one limited to the selected days
+    if args.since or args.until:
+        create_view(db, partitions(db, args.since, args.until), temporary=True)
+    try:
+        cursor = db.execute(args.sql)
+    except sqlite3.Error as e:
+        sys.exit(f"Query error: {e}")
+
+    writer = csv.writer(sys.stdout)
+    if cursor.description:
+        writer.writerow(column[0] for column in cursor.description)
+    writer.writerows(cursor)
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--db",
+        default="heroku_logs.sqlite3",
+        help="SQLite database file (default: heroku_logs.sqlite3)",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Import log files")
+    ingest_parser.add_argument(
+        "log_files",
+        nargs="+",
+        help="Log files (plain, .gz or .zst)",
+    )
+    ingest_parser.set_defaults(func=ingest)
+
+    info_parser = subparsers.add_parser("info", help="List imported files and days")
+    info_parser.set_defaults(func=info)
+
+    query_parser = subparsers.add_parser("query", help="Run a SQL query, as CSV")
+    query_parser.add_argument(
+        "sql",
+        help="SQL query, e.g. on the requests view",
+    )
+    query_parser.add_argument(
+        "--since",
+        required=False,
+        help="Only include requests from this day (YYYY-MM-DD)",
+    )
+    query_parser.add_argument(
+        "--until",
+        required=False,
+        help="Only include requests until this day (YYYY-MM-DD)",
+    )
+    query_parser.set_defaults(func=query)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Matcher for Pontoon's BLOCKED_IPS setting: a comma-separated list of IPv4 and
+IPv6 addresses and ranges (CIDR notation), e.g. "1.2.3.4, 5.6.0.0/16, 2001:db8::/32".
+
+Entries are compiled once into a binary prefix trie per IP version, so that
+checking an address costs at most one step per bit of the address (32 for
+IPv4, 128 for IPv6), whatever the size of the list.
+
+suggest_ranges() computes the minimal set of ranges covering offending IPs,
+with limited collateral (requests from other IPs in the same ranges).
+
+Usage:
+    blocklist = Blocklist("1.2.3.4, 5.6.0.0/16")
+    "5.6.7.8" in blocklist      # True
+    blocklist.match("5.6.7.8")  # "5.6.0.0/16"
+"""
+
+from bisect import bisect_left
+from functools import lru_cache
+from ipaddress import IPv4Network, IPv6Network, ip_address, ip_network
+
+# Subnets used to aggregate traffic, by IP version. The first one is also the
+# broadest range ever suggested for blocking.
+SUBNET_PREFIXES = {4: (16, 24), 6: (48, 64)}
+
+
+class PrefixTrie:
+    """Binary trie of network prefixes of a single IP version."""
+
+    def __init__(self, bits):
+        self.bits = bits
+        # Each node is [child for bit 0, child for bit 1, matching entry]
+        self.root = [None, None, None]
+
+    def insert(self, network, entry):
+        address = int(network.network_address)
+        node = self.root
+        for i in range(network.prefixlen):
+            bit = (address >> (self.bits - 1 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        if node[2] is None:
+            node[2] = entry
+
+    def match(self, address):
+        """Return the entry of the shortest prefix containing address, or None."""
+        address = int(address)
+        node = self.root
+        for i in range(self.bits):
+            if node[2] is not None:
+                return node[2]
+            node = node[(address >> (self.bits - 1 - i)) & 1]
+            if node is None:
+                return None
+
+        return node[2]
+
+
+class Blocklist:
+    def __init__(self, setting=""):
+        self.tries = {4: PrefixTrie(32), 6: PrefixTrie(128)}
+        self.entries = []
+        self.invalid = []
+
+        for entry in setting.split(","):
+            entry = entry.strip()
+            if entry == "":
+                continue
+            try:
+                # Single IPs are stored as /32 (IPv4) or /128 (IPv6) networks
+                network = ip_network(entry, strict=False)
+            except ValueError:
+                self.invalid.append(entry)
+                continue
+            self.tries[network.version].insert(network, entry)
+            self.entries.append(entry)
+
+    def match(self, ip):
+        """Return the entry blocking ip (string or ip_address), or None."""
+        if isinstance(ip, str):
+            try:
+                ip = ip_address(ip)
+            except ValueError:
+                return None
+
+        return self.tries[ip.version].match(ip)
+
+    def __contains__(self, ip):
+        return self.match(ip) is not None
+
+    def __len__(self):
+        return len(self.entries)
+
+
+@lru_cache(maxsize=65536)
+def subnet(ip, prefix=None):
+    """
+    Return the network of the given prefix length containing ip (default: /24
+    for IPv4, /64 for IPv6) as a string, None if ip is invalid.
+    """
+    try:
+        ip = ip_address(ip)
+    except ValueError:
+        return None
+    if prefix is None:
+        prefix = SUBNET_PREFIXES[ip.version][-1]
+    return str(ip_network(f"{ip}/{prefix}", strict=False))
+
+
+def _cover(items, version, network, prefixlen, max_collateral, ranges):
+    """
+    Add to ranges the networks covering offenders in items, sorted tuples of
+    (address, offending requests, benign requests) within network/prefixlen.
+    """
+    offending = sum(item[1] for item in items)
+    if not offending:
+        return
+    benign = sum(item[2] for item in items)
+    bits = 32 if version == 4 else 128
+    min_prefix = SUBNET_PREFIXES[version][0]
+
+    if prefixlen >= min_prefix and benign <= max_collateral * (offending + benign):
+        # Shrink the range to the smallest one containing all offenders
+        addresses = [address for address, count, _ in items if count]
+        common = bits - (addresses[0] ^ addresses[-1]).bit_length()
+        network_class = IPv4Network if version == 4 else IPv6Network
+        ranges.append(network_class((addresses[0], common), strict=False))
+        return
+
+    middle = network | (1 << (bits - prefixlen - 1))
+    split = bisect_left(items, (middle,))
+    for child, child_items in [(network, items[:split]), (middle, items[split:])]:
+        _cover(child_items, version, child, prefixlen + 1, max_collateral, ranges)
+
+
+def suggest_ranges(counts, threshold, max_collateral=0.05):
+    """
+    Return the minimal list of ranges (ip_network) covering all the IPs with
+    at least threshold requests in counts (IP: requests), such that in each
+    range at most max_collateral of the requests come from other IPs. Ranges
+    are never broader than the first SUBNET_PREFIXES.
+    """
+    items = {4: [], 6: []}
+    for ip, count in counts.items():
+        try:
+            address = ip_address(ip)
+        except ValueError:
+            continue
+        offending = count if count >= threshold else 0
+        items[address.version].append((int(address), offending, count - offending))
+
+    ranges = []
+    for version, version_items in items.items():
+        _cover(sorted(version_items), version, 0, 0, max_collateral, ranges)
+
+    return ranges
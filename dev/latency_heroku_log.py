@@ -0,0 +1,197 @@
+"""
+This script reports latency percentiles for each endpoint in Heroku router
+logs: request count, and p50/p95/p99 of the service time (time spent in the
+app) and of the connect time, per route template (e.g. requests to
+/it/firefox/all-resources/?string=123 count as
+/{locale}/{project}/all-resources/?string=*).
+
+Percentiles come from streaming quantile sketches (within 1% of the exact
+value), and sketches are kept for at most --max-endpoints route templates:
+the busiest ones, tracked with Space-Saving (see heavy_hitters.py). Memory is
+bounded by that number whatever the size of the log. When there are more
+templates than that (e.g. scans of random URLs), a template evicted then
+tracked again only reports the requests seen since. With --jobs, chunks of
+the log are scanned in parallel processes and their sketches merged.
+
+Download a portion of the log from Heroku and save it locally, e.g.
+
+timeout 60 heroku logs --tail --app mozilla-pontoon > log.txt
+
+Usage:
+    python latency_heroku_log.py log.txt
+    python latency_heroku_log.py --sort p99 --min-count 100 log.txt.gz
+    python latency_heroku_log.py --jobs 8 huge_log.txt
+"""
+
+from collections import defaultdict
+from multiprocessing import Pool
+import argparse
+import os
+import sys
+
+from heavy_hitters import SpaceSaving
+from heroku_log import (
+    check_log_file,
+    chunk_boundaries,
+    normalize_path,
+    open_log,
+    parse_router_line,
+)
+from quantile_sketch import DDSketch
+
+SORT_KEYS = {
+    "count": lambda sketches: sketches[0].count,
+    "total": lambda sketches: sketches[0].sum,
+    "p50": lambda sketches: sketches[0].quantile(0.5),
+    "p95": lambda sketches: sketches[0].quantile(0.95),
+    "p99": lambda sketches: sketches[0].quantile(0.99),
+}
+
+# Default number of route templates with sketches
+MAX_ENDPOINTS = 10000
+
+
+def add_line(sketches, endpoints, line):
+    record = parse_router_line(line)
+    if record is None or record.service is None:
+        return
+
+    path = normalize_path(record.path)
+    evicted = endpoints.add(path)
+    if evicted is not None:
+        del sketches[evicted]
+    service, connect = sketches[path]
+    service.add(record.service)
+    if record.connect is not None:
+        connect.add(record.connect)
+
+
+def new_sketches():
+    return defaultdict(lambda: (DDSketch(), DDSketch()))
+
+
+def _scan_chunk(args):
+    log_file, start, end, max_endpoints = args
+    sketches = new_sketches()
+    endpoints = SpaceSaving(max_endpoints)
+
+    with open(log_file, "rb") as f:
+        f.seek(start)
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            add_line(sketches, endpoints, line.decode("utf-8", errors="replace"))
+
+    # Lambdas can't be pickled back to the parent process
+    return dict(sketches)
+
+
+def scan(log_file, jobs, max_endpoints=MAX_ENDPOINTS):
+    sketches = new_sketches()
+
+    if jobs == 1:
+        endpoints = SpaceSaving(max_endpoints)
+        with open_log(log_file) as f:
+            for line in f:
+                add_line(sketches, endpoints, line)
+        return sketches
+
+    if log_file == "-" or log_file.endswith((".gz", ".zst")):
+        sys.exit("Parallel scanning is only available for uncompressed files.")
+    tasks = [
+        (log_file, start, end, max_endpoints)
+        for start, end in chunk_boundaries(log_file)
+    ]
+    with Pool(jobs or os.cpu_count()) as pool:
+        for chunk_sketches in pool.imap_unordered(_scan_chunk, tasks):
+            for path, (service, connect) in chunk_sketches.items():
+                sketches[path][0].merge(service)
+                sketches[path][1].merge(connect)
+
+            # Chunks may track different templates: keep the busiest ones
+            if len(sketches) > max_endpoints:
+                busiest = sorted(
+                    sketches.items(), key=lambda item: item[1][0].count, reverse=True
+                )
+                sketches = new_sketches()
+                sketches.update(busiest[:max_endpoints])
+
+    return sketches
+
+
+def format_ms(value):
+    return "-" if value is None else f"{value:.0f}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "log_file",
+        help="Path to log file, or - to read from stdin",
+    )
+    parser.add_argument(
+        "--sort",
+        required=False,
+        choices=SORT_KEYS.keys(),
+        default="total",
+        help="Order endpoints by request count, total service time or percentile",
+    )
+    parser.add_argument(
+        "--top",
+        required=False,
+        type=int,
+        default=20,
+        help="Number of endpoints to report",
+    )
+    parser.add_argument(
+        "--min-count",
+        required=False,
+        type=int,
+        default=1,
+        help="Ignore endpoints with fewer requests",
+    )
+    parser.add_argument(
+        "--jobs",
+        required=False,
+        type=int,
+        default=1,
+        help="Number of processes scanning the log in parallel (0: all CPUs)",
+    )
+    parser.add_argument(
+        "--max-endpoints",
+        required=False,
+        type=int,
+        default=MAX_ENDPOINTS,
+        help=f"Maximum number of route templates tracked (default: {MAX_ENDPOINTS})",
+    )
+    args = parser.parse_args()
+    log_file = args.log_file
+
+    check_log_file(log_file)
+
+    sketches = scan(log_file, args.jobs, args.max_endpoints)
+    endpoints = [
+        (path, endpoint_sketches)
+        for path, endpoint_sketches in sketches.items()
+        if endpoint_sketches[0].count >= args.min_count
+    ]
+    endpoints.sort(key=lambda item: SORT_KEYS[args.sort](item[1]), reverse=True)
+
+    print(
+        f"{'Count':>8} {'p50':>7} {'p95':>7} {'p99':>7} {'Max':>7} "
+        f"{'Connect p99':>11}  Path (service times in ms)"
+    )
+    for path, (service, connect) in endpoints[: args.top]:
+        print(
+            f"{service.count:>8} "
+            f"{format_ms(service.quantile(0.5)):>7} "
+            f"{format_ms(service.quantile(0.95)):>7} "
+            f"{format_ms(service.quantile(0.99)):>7} "
+            f"{format_ms(service.max):>7} "
+            f"{format_ms(connect.quantile(0.99)):>11}  {path}"
+        )
+
+
+if __name__ == "__main__":
+    main()
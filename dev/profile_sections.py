@@ -0,0 +1,180 @@
+"""
+Profile named sections of scripts run in Pontoon's Django shell: for each
+section, wall time, time spent in database queries, number of queries, rows
+returned, and peak of memory allocated in Python (tracemalloc).
+
+Sections can be nested, and are aggregated by path when run several times
+(e.g. a decorated function called in a loop). Queries are captured with the
+execute wrappers of debug_sql_performance.py, so DEBUG=True isn't needed.
+
+Usage, e.g. in stats/covid/general_stats.py:
+
+from profile_sections import profile_section, write_profile_report
+
+with profile_section("Active Users"):
+    ...
+
+with profile_section("New Entity Creations"):
+    ...
+
+@profile_section("Format period")
+def format_period(date):
+    ...
+
+write_profile_report()
+
+write_profile_report() prints a summary to stderr, and writes:
+* profile.json: metrics of each section
+* profile.folded: self time of each section in collapsed stack format, in
+  microseconds, for flamegraph.pl or https://www.speedscope.app
+
+Call enable_memory_profiling(False) before the first section to skip
+tracemalloc, which slows down Python code noticeably.
+"""
+
+from contextlib import ContextDecorator, ExitStack
+from time import perf_counter_ns
+import json
+import sys
+import tracemalloc
+
+from debug_sql_performance import QueryReport, capture_queries
+
+
+class Profiler:
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.queries = QueryReport(max_queries=0)
+        # Open sections, innermost last
+        self.stack = []
+        # Totals by path ("outer;inner"), in the order sections are entered
+        self.sections = {}
+        self.capture = None
+        self.started_tracing = False
+
+    def enter(self, name):
+        if not self.stack:
+            self.capture = ExitStack()
+            self.capture.enter_context(capture_queries(self.queries))
+            if self.memory and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.started_tracing = True
+
+        memory = 0
+        if self.memory:
+            memory, peak = tracemalloc.get_traced_memory()
+            # The peak is reset for the new section: keep the parent's so far
+            if self.stack:
+                self.stack[-1]["peak"] = max(self.stack[-1]["peak"], peak)
+            tracemalloc.reset_peak()
+
+        path = ";".join([frame["path"] for frame in self.stack[-1:]] + [name])
+        self.sections.setdefault(
+            path,
+            {
+                "name": name,
+                "path": path,
+                "calls": 0,
+                "wall_ms": 0,
+                "self_ms": 0,
+                "db_ms": 0,
+                "queries": 0,
+                "rows": 0,
+                "memory_peak_kib": 0,
+            },
+        )
+        self.stack.append(
+            {
+                "path": path,
+                "start": perf_counter_ns(),
+                "db": self.queries.time,
+                "queries": self.queries.count,
+                "rows": self.queries.rows,
+                "memory": memory,
+                "peak": memory,
+                "children": 0,
+            }
+        )
+
+    def exit(self):
+        frame = self.stack.pop()
+        wall = perf_counter_ns() - frame["start"]
+
+        peak = frame["peak"]
+        if self.memory:
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+
+        section = self.sections[frame["path"]]
+        section["calls"] += 1
+        section["wall_ms"] += wall / 1e6
+        section["self_ms"] += (wall - frame["children"]) / 1e6
+        section["db_ms"] += (self.queries.time - frame["db"]) / 1e6
+        section["queries"] += self.queries.count - frame["queries"]
+        section["rows"] += self.queries.rows - frame["rows"]
+        section["memory_peak_kib"] = max(
+            section["memory_peak_kib"], (peak - frame["memory"]) / 1024
+        )
+
+        if self.stack:
+            self.stack[-1]["children"] += wall
+            self.stack[-1]["peak"] = max(self.stack[-1]["peak"], peak)
+        else:
+            self.capture.close()
+            if self.started_tracing:
+                tracemalloc.stop()
+                self.started_tracing = False
+
+    def report(self):
+        return list(self.sections.values())
+
+    def write_report(self, filename="profile.json", folded_filename="profile.folded"):
+        sections = self.report()
+
+        with open(filename, "w") as f:
+            json.dump({"sections": sections}, f, indent=2)
+        with open(folded_filename, "w") as f:
+            for section in sections:
+                f.write(f"{section['path']} {int(section['self_ms'] * 1000)}\n")
+
+        print(
+            f"{'Wall (ms)':>10} {'DB (ms)':>10} {'Queries':>8} {'Rows':>9} "
+            f"{'Peak (KiB)':>10}  Section",
+            file=sys.stderr,
+        )
+        for section in sections:
+            indent = "  " * section["path"].count(";")
+            print(
+                f"{section['wall_ms']:>10.1f} {section['db_ms']:>10.1f} "
+                f"{section['queries']:>8} {section['rows']:>9} "
+                f"{section['memory_peak_kib']:>10.0f}  {indent}{section['name']}"
+                + (f" (x{section['calls']})" if section["calls"] > 1 else ""),
+                file=sys.stderr,
+            )
+        print(f"Profile saved to {filename} and {folded_filename}", file=sys.stderr)
+
+
+PROFILER = Profiler()
+
+
+class profile_section(ContextDecorator):
+    """Context manager and decorator profiling a named section."""
+
+    def __init__(self, name, profiler=None):
+        self.name = name
+        self.profiler = profiler or PROFILER
+
+    def __enter__(self):
+        self.profiler.enter(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.exit()
+        return False
+
+
+def enable_memory_profiling(enabled=True):
+    PROFILER.memory = enabled
+
+
+def write_profile_report(filename="profile.json", folded_filename="profile.folded"):
+    PROFILER.write_report(filename, folded_filename)
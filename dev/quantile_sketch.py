@@ -0,0 +1,91 @@
+"""
+Streaming quantile sketch with bounded memory (DDSketch).
+
+Values are counted in logarithmic buckets: bucket i holds values in
+(gamma^(i-1), gamma^i], with gamma = (1 + accuracy) / (1 - accuracy), so any
+quantile is returned within `accuracy` relative error (1% by default).
+Memory depends on the range of values, not on how many were added, and is
+capped at `max_buckets` by collapsing the lowest buckets.
+
+Sketches built on separate parts of a log (e.g. by parallel workers) are
+merged by adding bucket counts, with the same guarantees as a single sketch.
+
+Usage:
+    sketch = DDSketch()
+    for value in values:
+        sketch.add(value)
+    sketch.quantile(0.99)
+"""
+
+from collections import Counter
+import math
+
+
+class DDSketch:
+    def __init__(self, accuracy=0.01, max_buckets=2048):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.buckets = Counter()
+        # Values <= 0 (e.g. 0ms service times) can't be bucketed by log
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value, count=1):
+        if value > 0:
+            self.buckets[math.ceil(math.log(value) / self.log_gamma)] += count
+            if len(self.buckets) > self.max_buckets:
+                self._collapse()
+        else:
+            self.zero_count += count
+
+        self.count += count
+        self.sum += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def _collapse(self):
+        """Merge the lowest buckets, keeping high quantiles accurate."""
+        indexes = sorted(self.buckets)
+        excess = indexes[: len(indexes) - self.max_buckets + 1]
+        self.buckets[excess[-1]] += sum(self.buckets.pop(i) for i in excess[:-1])
+
+    def merge(self, other):
+        """Add the values counted by another sketch with the same accuracy."""
+        if other.gamma != self.gamma:
+            raise ValueError("Can't merge sketches with different accuracy.")
+
+        self.buckets.update(other.buckets)
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """Return the value at quantile q (0 <= q <= 1), None if empty."""
+        if not self.count:
+            return None
+
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0
+        seen = self.zero_count
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # Midpoint of the bucket, in relative terms
+                value = 2 * self.gamma**index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+
+        return self.max
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
@@ -1,75 +1,76 @@
 #!/usr/bin/env python3
 
-import json
+"""
+Extract completion stats per locale for Firefox products.
+
+Output as CSV file with columns Locale, Number of Projects, Completion,
+Approved strings, Total Strings.
+
+Usage:
+    python extract_completion_data.py
+
+    # Aggregate with NumPy, for any set of projects, with extra completion
+    # columns for subsets of projects and locales ranked by completion
+    python extract_completion_data.py --numpy --projects firefox firefox-for-android \
+        --project-set mobile=firefox-for-android,firefox-for-ios --rank
+
+    # Use a snapshot stored by API/snapshots.py instead of fetching data
+    python extract_completion_data.py --numpy --snapshot snapshot-20240101T000000.npz
+"""
+
+import argparse
 import os
 import sys
-from urllib.parse import quote as urlquote
-from urllib.request import urlopen
 
+# Shared Pontoon API client lives in the API folder
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "API")
+)
+from pontoon_api import iter_localizations, projects_query
 
-def main():
-    projects = [
-        "firefox-for-android",
-        "firefox-for-ios",
-        "firefox-monitor-website",
-        "firefox-relay-website",
-        "firefox",
-        "mozilla-accounts",
-        "mozilla-vpn-client",
-    ]
+PROJECTS = [
+    "firefox-for-android",
+    "firefox-for-ios",
+    "firefox-monitor-website",
+    "firefox-relay-website",
+    "firefox",
+    "mozilla-accounts",
+    "mozilla-vpn-client",
+]
 
-    # Get stats from Pontoon
-    query = """
-{
-    projects {
-        name
-        slug
-        localizations {
-            locale {
-                code
-            },
-            approvedStrings,
-            stringsWithWarnings,
-            missingStrings,
-            pretranslatedStrings,
-            totalStrings
+# Localization fields used by this report
+FIELDS = [
+    "approvedStrings",
+    "stringsWithWarnings",
+    "missingStrings",
+    "pretranslatedStrings",
+    "totalStrings",
+]
+
+
+def aggregate(locale_data, project, e):
+    slug = project["slug"]
+    if slug not in PROJECTS:
+        return
+
+    locale = e["locale"]["code"]
+    if locale not in locale_data:
+        locale_data[locale] = {
+            "projects": 0,
+            "missing": 0,
+            "approved": 0,
+            "pretranslated": 0,
+            "total": 0,
+            "completion": 0,
         }
-    }
-}
-"""
-    locale_data = {}
-    try:
-        print("Reading Pontoon stats...")
-        url = f"https://pontoon.mozilla.org/graphql?query={urlquote(query)}&raw"
-        response = urlopen(url)
-        json_data = json.load(response)
-
-        for project in json_data["data"]["projects"]:
-            slug = project["slug"]
-            if slug not in projects:
-                continue
-
-            for e in project["localizations"]:
-                locale = e["locale"]["code"]
-                if locale not in locale_data:
-                    locale_data[locale] = {
-                        "projects": 0,
-                        "missing": 0,
-                        "approved": 0,
-                        "pretranslated": 0,
-                        "total": 0,
-                        "completion": 0,
-                    }
-                locale_data[locale]["missing"] += e["missingStrings"]
-                locale_data[locale]["pretranslated"] += e["pretranslatedStrings"]
-                locale_data[locale]["approved"] += (
-                    e["approvedStrings"] + e["stringsWithWarnings"]
-                )
-                locale_data[locale]["total"] += e["totalStrings"]
-                locale_data[locale]["projects"] += 1
-    except Exception as e:
-        print(e)
+    locale_data[locale]["missing"] += e["missingStrings"]
+    locale_data[locale]["pretranslated"] += e["pretranslatedStrings"]
+    locale_data[locale]["approved"] += e["approvedStrings"] + e["stringsWithWarnings"]
+    locale_data[locale]["total"] += e["totalStrings"]
+    locale_data[locale]["projects"] += 1
+
 
+def write_output(locale_data, filename="output.csv"):
     # Calculate completion percentage
     for locale in locale_data:
         if locale_data[locale]["total"] > 0:
@@ -89,9 +90,157 @@ def main():
         )
 
     # Save locally
-    with open("output.csv", "w") as f:
+    with open(filename, "w") as f:
+        f.write("\n".join(output))
+        print(f"Data stored as {filename}")
+
+
+def completion(approved, total):
+    import numpy as np
+
+    ratio = np.divide(
+        approved, total, out=np.zeros(len(total), dtype=float), where=total > 0
+    )
+    return np.round(ratio * 100, 2)
+
+
+def write_output_numpy(
+    matrix, projects, project_sets=None, rank=False, filename="output.csv"
+):
+    """
+    Same report as write_output(), computed with vectorized reductions over
+    a StatsMatrix, for any set of projects.
+
+    project_sets maps names to lists of projects, and adds a completion
+    column for each of them. With rank=True, locales are sorted by
+    completion instead of code, and a Rank column is added.
+    """
+    import numpy as np
+
+    approved = matrix.totals("approved", projects) + matrix.totals(
+        "warnings", projects
+    )
+    total = matrix.totals("total", projects)
+    project_counts = matrix.project_counts(projects)
+    locale_completion = completion(approved, total)
+
+    set_completion = {}
+    for name, set_projects in (project_sets or {}).items():
+        set_completion[name] = completion(
+            matrix.totals("approved", set_projects)
+            + matrix.totals("warnings", set_projects),
+            matrix.totals("total", set_projects),
+        )
+
+    # Only keep locales enabled in at least one of the projects
+    locales = np.array(matrix.locales)
+    selected = np.flatnonzero(project_counts > 0)
+    if rank:
+        order = selected[np.lexsort((locales[selected], -locale_completion[selected]))]
+    else:
+        order = selected[np.argsort(locales[selected])]
+
+    header = "Locale,Number of Projects,Completion,Approved strings,Total Strings"
+    if rank:
+        header = "Rank," + header
+    header += "".join(f",{name} Completion" for name in set_completion)
+
+    output = [header]
+    for position, i in enumerate(order, start=1):
+        row = [
+            locales[i],
+            project_counts[i],
+            locale_completion[i],
+            approved[i],
+            total[i],
+        ]
+        if rank:
+            row.insert(0, position)
+        row += [values[i] for values in set_completion.values()]
+        output.append(",".join(str(value) for value in row))
+
+    # Save locally
+    with open(filename, "w") as f:
         f.write("\n".join(output))
-        print("Data stored as output.csv")
+        print(f"Data stored as {filename}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--numpy",
+        action="store_true",
+        help="Aggregate stats with NumPy (requires numpy)",
+    )
+    parser.add_argument(
+        "--projects",
+        nargs="+",
+        help="Projects to include (default: Firefox products), only with --numpy",
+    )
+    parser.add_argument(
+        "--project-set",
+        action="append",
+        default=[],
+        dest="project_sets",
+        metavar="NAME=SLUG,SLUG",
+        help="Add a completion column for a set of projects, only with --numpy",
+    )
+    parser.add_argument(
+        "--rank",
+        action="store_true",
+        help="Sort locales by completion, only with --numpy",
+    )
+    parser.add_argument(
+        "--snapshot",
+        help="Read stats from a snapshot stored by API/snapshots.py, only with --numpy",
+    )
+    args = parser.parse_args()
+
+    if not args.numpy:
+        for option, value in [
+            ("--projects", args.projects),
+            ("--project-set", args.project_sets),
+            ("--rank", args.rank),
+            ("--snapshot", args.snapshot),
+        ]:
+            if value:
+                parser.error(f"{option} requires --numpy")
+
+    if args.numpy:
+        from stats_matrix import FIELDS as MATRIX_FIELDS, StatsMatrix
+
+        project_sets = {}
+        for project_set in args.project_sets:
+            name, _, slugs = project_set.partition("=")
+            project_sets[name] = slugs.split(",")
+
+        try:
+            if args.snapshot:
+                matrix = StatsMatrix.load(args.snapshot)
+            else:
+                print("Reading Pontoon stats...")
+                matrix = StatsMatrix.from_localizations(
+                    iter_localizations(projects_query(MATRIX_FIELDS.values()))
+                )
+        except Exception as e:
+            sys.exit(f"Error reading Pontoon stats: {e}")
+        write_output_numpy(
+            matrix, args.projects or PROJECTS, project_sets, args.rank
+        )
+        return
+
+    # Get stats from Pontoon
+    locale_data = {}
+    try:
+        print("Reading Pontoon stats...")
+        for project, e in iter_localizations(projects_query(FIELDS)):
+            aggregate(locale_data, project, e)
+    except Exception as e:
+        # Don't write partial output: the payload is a single request, which
+        # is fetched again from scratch on the next run.
+        sys.exit(f"Error reading Pontoon stats: {e}")
+
+    write_output(locale_data)
 
 
 if __name__ == "__main__":